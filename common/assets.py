@@ -0,0 +1,63 @@
+import os
+import time
+
+import pygame
+
+# Fonts shared by both front ends. pygame.font.SysFont looks the name up
+# among the system fonts on every call, and the first lookup scans them all,
+# which stalls a frame when it happens mid-game. Here a name is resolved to a
+# file once and every (name, size) is loaded once; the front ends preload
+# theirs while the window opens and only fetch cached fonts afterwards.
+#
+# A font file bundled as assets/fonts/<name>.ttf (or .otf) wins over the
+# system font of that name. None is pygame's default font, as with SysFont.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FONT_DIR = os.path.join(ROOT, 'assets', 'fonts')
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+
+class Fonts:
+    def __init__(self, font_dir=FONT_DIR):
+        self.font_dir = font_dir
+        self.paths = {}  # name -> font file, None for pygame's default
+        self.fonts = {}  # (name, size) -> pygame.font.Font
+        self.load_ms = 0.0  # time spent resolving and loading so far
+
+    def path(self, name):
+        if name in self.paths:
+            return self.paths[name]
+        path = None
+        if name is not None:
+            file_name = name.lower().replace(' ', '')
+            for extension in FONT_EXTENSIONS:
+                bundled = os.path.join(self.font_dir, file_name + extension)
+                if os.path.isfile(bundled):
+                    path = bundled
+                    break
+            else:
+                path = pygame.font.match_font(name)
+        self.paths[name] = path
+        return path
+
+    def get(self, name, size):
+        font = self.fonts.get((name, size))
+        if font is None:
+            start = time.perf_counter()
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(self.path(name), size)
+            self.fonts[(name, size)] = font
+            self.load_ms += (time.perf_counter() - start) * 1000
+        return font
+
+    def preload(self, specs):
+        # Load every (name, size) in specs; returns the ms it took
+        start = time.perf_counter()
+        for name, size in specs:
+            self.get(name, size)
+        return (time.perf_counter() - start) * 1000
+
+
+# The one instance both front ends load through
+FONTS = Fonts()
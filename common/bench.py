@@ -0,0 +1,433 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Micro and whole-game benchmarks for both games. Each benchmark reports the
+# best mean time per call over a few repeats; results are written as JSON and
+# compared against a baseline so regressions show up as a non-zero exit.
+# Timings only compare on the machine that made them, so the baseline is a
+# local, untracked file: record one with --save-baseline before changing
+# anything. A benchmark that comes out slower is timed again, and only a
+# slowdown that survives every retry is reported.
+#
+#   python common/bench.py                            compare with bench_baseline.json
+#   python common/bench.py --output results.json      also keep the raw results
+#   python common/bench.py --save-baseline            record a new baseline
+#   python common/bench.py --filter tetris.           run a subset
+
+from paths import ROOT
+
+# The drawing benchmarks render to offscreen surfaces
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import tetris_engine
+import joltzsi_engine
+import packed
+from bitboard import BitBoard
+from rollout import Job, run_job
+from score_store import ScoreStore, pack_record
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+THRESHOLD = 0.2  # slower than the baseline by more than this fraction is a regression
+RETRIES = 5  # extra timings of a slow benchmark before it counts as a regression
+
+SCORE_FILE_SIZE = 100000
+
+BENCHMARKS = []
+THRESHOLDS = {}  # name -> threshold of benchmarks that need their own
+
+
+def benchmark(name, number, repeat=5, threshold=None):
+    # Register setup(), which returns the zero-argument function to time.
+    # The function may set .ops when one call covers several operations, or
+    # .self_timed when it returns its own elapsed seconds. threshold replaces
+    # THRESHOLD for benchmarks noisier than the CPU-bound ones.
+    def register(setup):
+        BENCHMARKS.append((name, setup, number, repeat))
+        if threshold is not None:
+            THRESHOLDS[name] = threshold
+        return setup
+    return register
+
+
+def load_front_end(game):
+    # The two front ends are both called main.py, so load them under
+    # distinct module names
+    name = f'{game}_main'
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, game, 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    module.init_display()
+    return module
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def stacked_grid(rng, full_rows=0, height=12):
+    # A Tetris grid with random rubble in the bottom rows, the last
+    # full_rows of them complete
+    grid = tetris_engine.create_grid()
+    for y in range(tetris_engine.ROWS - height, tetris_engine.ROWS):
+        full = y >= tetris_engine.ROWS - full_rows
+        grid[y] = [1 if full or rng.random() < 0.6 else 0 for _ in range(tetris_engine.COLUMNS)]
+    return grid
+
+
+@benchmark('tetris.collision', number=2000)
+def bench_tetris_collision():
+    rng = random.Random(1)
+    grid = stacked_grid(rng)
+    pieces = [tetris_engine.spawn_piece(rng) for _ in range(64)]
+    for piece in pieces:
+        piece.y = rng.randrange(tetris_engine.ROWS - 4)
+    moves = [(piece, rng.choice((-1, 0, 1)), rng.choice((0, 1))) for piece in pieces]
+
+    def run():
+        for piece, dx, dy in moves:
+            piece.collision(grid, dx, dy)
+    run.ops = len(moves)
+    return run
+
+
+@benchmark('tetris.bitboard_collision', number=2000)
+def bench_bitboard_collision():
+    rng = random.Random(1)
+    board = BitBoard.from_grid(stacked_grid(rng))
+    pieces = [tetris_engine.spawn_piece(rng) for _ in range(64)]
+    for piece in pieces:
+        piece.y = rng.randrange(tetris_engine.ROWS - 4)
+    moves = [(piece, rng.choice((-1, 0, 1)), rng.choice((0, 1))) for piece in pieces]
+
+    def run():
+        for piece, dx, dy in moves:
+            board.collision(piece, dx, dy)
+    run.ops = len(moves)
+    return run
+
+
+@benchmark('tetris.rotate', number=2000)
+def bench_tetris_rotate():
+    rng = random.Random(2)
+    pieces = [tetris_engine.spawn_piece(rng) for _ in range(64)]
+
+    def run():
+        for piece in pieces:
+            piece.rotate()
+    run.ops = len(pieces)
+    return run
+
+
+@benchmark('tetris.clear_lines', number=5000)
+def bench_tetris_clear_lines():
+    # find_cleared_lines plus the row compaction the line clear animation ends with
+    grid = stacked_grid(random.Random(3), full_rows=4)
+
+    def run():
+        board = [row[:] for row in grid]
+        tetris_engine.collapse_lines(board, tetris_engine.find_cleared_lines(board))
+    return run
+
+
+@benchmark('tetris.draw_grid', number=100)
+def bench_tetris_draw_grid():
+    front_end = load_front_end('tetris')
+    surface = front_end.pygame.Surface((front_end.SCREEN_WIDTH, front_end.SCREEN_HEIGHT))
+    grid = stacked_grid(random.Random(4))
+    return lambda: front_end.draw_grid(surface, grid)
+
+
+@benchmark('tetris.draw_sidebar', number=200)
+def bench_tetris_draw_sidebar():
+    front_end = load_front_end('tetris')
+    surface = front_end.pygame.Surface((front_end.SCREEN_WIDTH, front_end.SCREEN_HEIGHT))
+    piece = tetris_engine.spawn_piece(random.Random(5))
+    return lambda: front_end.draw_sidebar(surface, 123456, 78, 9, piece)
+
+
+@benchmark('tetris.render_frame', number=500)
+def bench_tetris_render_frame():
+    # One DirtyRenderer frame with the piece moving, the usual steady state
+    front_end = load_front_end('tetris')
+    surface = front_end.pygame.Surface((front_end.SCREEN_WIDTH, front_end.SCREEN_HEIGHT))
+    renderer = front_end.DirtyRenderer(surface)
+    state = tetris_engine.TetrisState(BitBoard.from_grid(stacked_grid(random.Random(6))),
+                                      random.Random(6))
+    directions = [1, 1, 1, -1, -1, -1]
+    step = [0]
+
+    def run():
+        state.move(directions[step[0] % len(directions)])
+        step[0] += 1
+        ghost_y = state.current_piece.y + state.board.drop_distance(state.current_piece)
+        renderer.draw(state, ghost_y)
+    return run
+
+
+@benchmark('joltzsi.can_place', number=2000)
+def bench_joltzsi_can_place():
+    rng = random.Random(7)
+    checks = [(joltzsi_engine.random_piece(rng), rng.randrange(-2, 6), rng.randrange(-2, 6))
+              for _ in range(64)]
+
+    def run():
+        for piece, x, y in checks:
+            joltzsi_engine.can_place(piece, x, y)
+    run.ops = len(checks)
+    return run
+
+
+@benchmark('joltzsi.place_piece', number=20000)
+def bench_joltzsi_place_piece():
+    rng = random.Random(8)
+    state = joltzsi_engine.JoltzsiState(rng)
+
+    def run():
+        nonlocal state
+        if state.game_over:
+            state = joltzsi_engine.JoltzsiState(rng)
+        state.step(*rng.choice(joltzsi_engine.legal_moves(state.current_piece)))
+    return run
+
+
+@benchmark('joltzsi.check_lines', number=200)
+def bench_joltzsi_check_lines():
+    rng = random.Random(9)
+    grids = []
+    for _ in range(64):
+        grid = [[rng.randint(0, 4) for _ in range(joltzsi_engine.GRID_SIZE)]
+                for _ in range(joltzsi_engine.GRID_SIZE)]
+        grid[rng.randrange(joltzsi_engine.GRID_SIZE)] = [2] * joltzsi_engine.GRID_SIZE
+        grids.append((grid, packed.encode(grid)))
+    state = joltzsi_engine.JoltzsiState(rng)
+
+    def run():
+        for grid, board in grids:
+            state.grid = [row[:] for row in grid]
+            state.board = board
+            state.check_lines()
+    run.ops = len(grids)
+    return run
+
+
+@benchmark('joltzsi.draw_grid', number=100)
+def bench_joltzsi_draw_grid():
+    front_end = load_front_end('joltzsi')
+    front_end.screen = front_end.pygame.Surface((front_end.SCREEN_WIDTH, front_end.SCREEN_HEIGHT))
+    rng = random.Random(10)
+    grid = [[rng.randint(0, 4) for _ in range(joltzsi_engine.GRID_SIZE)]
+            for _ in range(joltzsi_engine.GRID_SIZE)]
+    return lambda: front_end.draw_grid(grid)
+
+
+def score_store_bench(game, store_name):
+    # save_score against a store that already holds SCORE_FILE_SIZE scores
+    def setup():
+        front_end = load_front_end(game)
+        directory = tempfile.mkdtemp(prefix='bench-scores-')
+        rng = random.Random(11)
+        store = ScoreStore(os.path.join(directory, store_name))
+        with open(store.log_path, 'ab') as file:
+            now = int(time.time())
+            file.write(b''.join(pack_record(rng.randrange(1000000), now)
+                                for _ in range(SCORE_FILE_SIZE)))
+        store.compact()
+        front_end.score_store = None  # opened on the first save, in directory
+
+        def run():
+            with working_directory(directory):
+                front_end.save_score(rng.randrange(1000000))
+        run.cleanup = lambda: shutil.rmtree(directory)
+        return run
+    return setup
+
+
+# Every save waits for an fsync, whose time varies with the disk by tens of
+# percent from run to run; a real regression, such as rewriting the file,
+# costs tens of times more
+benchmark('tetris.save_score', number=50, repeat=3, threshold=1.0)(score_store_bench('tetris', 'tetris_scores'))
+benchmark('joltzsi.save_score', number=50, repeat=3, threshold=1.0)(score_store_bench('joltzsi', 'scores'))
+
+
+def game_bench(game, policy, games):
+    # Whole headless games through the rollout runner, in this process
+    def setup():
+        jobs = [Job(game, seed, policy) for seed in range(games)]
+
+        def run():
+            steps = 0
+            for job in jobs:
+                steps += run_job(job).steps
+            run.steps = steps
+        run.ops = games
+        return run
+    return setup
+
+
+benchmark('tetris.games_random', number=1, repeat=3)(game_bench('tetris', 'random', 200))
+benchmark('tetris.games_drop', number=1, repeat=3)(game_bench('tetris', 'drop', 500))
+benchmark('joltzsi.games_random', number=1, repeat=3)(game_bench('joltzsi', 'random', 2000))
+
+
+def cold_import_bench(modules, directory):
+    # Import time of modules in a fresh interpreter, started from the game
+    # directory the way the games are run
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(modules)}\n"
+        "sys.stdout.write(repr(time.perf_counter() - start))\n"
+    )
+
+    def setup():
+        def run():
+            output = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(ROOT, directory),
+                                    capture_output=True, text=True, check=True).stdout
+            return float(output.strip().splitlines()[-1])
+        run.self_timed = True
+        return run
+    return setup
+
+
+benchmark('tetris.import_engine', number=1)(cold_import_bench(['tetris_engine'], 'tetris'))
+benchmark('tetris.import_main', number=1)(cold_import_bench(['main'], 'tetris'))
+benchmark('joltzsi.import_engine', number=1)(cold_import_bench(['joltzsi_engine'], 'joltzsi'))
+benchmark('joltzsi.import_main', number=1)(cold_import_bench(['main'], 'joltzsi'))
+
+
+def run_benchmark(setup, number, repeat):
+    run = setup()
+    try:
+        best = float('inf')
+        for _ in range(repeat):
+            if getattr(run, 'self_timed', False):
+                best = min(best, sum(run() for _ in range(number)))
+                continue
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        cleanup = getattr(run, 'cleanup', None)
+        if cleanup is not None:
+            cleanup()
+    ops = number * getattr(run, 'ops', 1)
+    result = {'us_per_op': best / ops * 1e6, 'ops': ops}
+    if hasattr(run, 'steps'):
+        result['games_per_s'] = run.ops / (best / number)
+        result['steps_per_s'] = run.steps / (best / number)
+    return result
+
+
+def run_all(pattern=''):
+    results = {}
+    for name, setup, number, repeat in BENCHMARKS:
+        if pattern in name:
+            results[name] = run_benchmark(setup, number, repeat)
+    return results
+
+
+def retry_slow(results, baseline, threshold=None, retries=RETRIES):
+    # Time the benchmarks that look slower than the baseline again, keeping
+    # the best result, so that a busy machine does not pass for a regression
+    benchmarks = {name: (setup, number, repeat) for name, setup, number, repeat in BENCHMARKS}
+    for _ in range(retries):
+        regressions = compare(results, baseline, threshold)
+        if not regressions:
+            break
+        for name, _ in regressions:
+            result = run_benchmark(*benchmarks[name])
+            if result['us_per_op'] < results[name]['us_per_op']:
+                results[name] = result
+
+
+def compare(results, baseline, threshold=None):
+    # [(name, ratio)] for every benchmark slower than its baseline by more
+    # than threshold, or by more than its own threshold when that is None
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        ratio = result['us_per_op'] / previous['us_per_op']
+        limit = threshold if threshold is not None else THRESHOLDS.get(name, THRESHOLD)
+        if ratio > 1 + limit:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game hot paths")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store these results as the new baseline")
+    parser.add_argument('--threshold', type=float,
+                        help="allowed slowdown before a result counts as a regression, "
+                             f"for every benchmark (default {THRESHOLD} or the benchmark's own)")
+    args = parser.parse_args()
+
+    results = run_all(args.filter)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if not args.save_baseline:
+            retry_slow(results, baseline, args.threshold)
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}; record one with --save-baseline")
+
+    for name, result in results.items():
+        line = f"{name:<28} {result['us_per_op']:>12.2f} us/op"
+        previous = baseline.get('results', {}).get(name)
+        if previous is not None:
+            line += f"  {result['us_per_op'] / previous['us_per_op']:>6.2f}x baseline"
+        if 'games_per_s' in result:
+            line += f"  ({result['games_per_s']:,.0f} games/s, {result['steps_per_s']:,.0f} steps/s)"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, ratio in regressions:
+        print(f"REGRESSION {name}: {ratio:.2f}x slower than baseline")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import numpy as np
+
+# Board observations for learning agents, written straight from the game
+# state into preallocated NumPy buffers instead of drawing with pygame and
+# reading the screen back. Each observer owns one buffer with a leading batch
+# axis; write() fills it in place and returns it, so stepping never allocates
+# an observation. Boards are unpacked from the engines' own bit encodings
+# (BitBoard rows, packed Joltzsi boards) through preallocated arrays rather
+# than converted from the nested-list grids. Tetris rgb mode is the
+# exception: colours only exist in the grid.
+#
+#   planes   (batch, channels, rows, cols) one-hot planes, float32 by default
+#   rgb      (batch, rows * scale, cols * scale, 3) uint8 at scale pixels per
+#            cell, in the colors the front ends draw with; Tetris adds a
+#            sidebar with the next piece, Joltzsi fills the piece's cells
+#            with the highlight color
+
+import paths
+
+import tetris_engine
+import joltzsi_engine
+import packed
+
+MODES = ('planes', 'rgb')
+
+TETRIS_PLANES = ('board', 'piece', 'ghost', 'next')
+TETRIS_SIDEBAR = 5  # columns right of the board holding the next piece in rgb mode
+GHOST = len(tetris_engine.COLORS) + 1  # palette index of ghost cells
+TETRIS_PALETTE = np.array([(0, 0, 0)] + tetris_engine.COLORS + [(200, 200, 200)], dtype=np.uint8)
+
+JOLTZSI_PLANES = ('empty', 'value1', 'value2', 'value3', 'value4', 'piece')
+OVERFLOW = 5  # palette index of values above 4
+HIGHLIGHT = 6
+JOLTZSI_PALETTE = np.array(
+    [joltzsi_engine.COLORS[value] for value in range(5)]
+    + [joltzsi_engine.OVERFLOW_COLOR, joltzsi_engine.HIGHLIGHT_COLOR],
+    dtype=np.uint8,
+)
+
+
+def spawn_cells(type_id):
+    # Board cells of a freshly spawned piece
+    piece = tetris_engine.Tetromino(tetris_engine.ROTATIONS[type_id][0], type_id)
+    return [(piece.x + x, piece.y + y) for x, y in tetris_engine.ROTATION_INFO[type_id][0].cells]
+
+
+SPAWN_CELLS = [spawn_cells(type_id) for type_id in range(len(tetris_engine.SHAPES))]
+
+
+class Observer:
+    def __init__(self, batch, mode, channels, rows, cols, scale, dtype):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+        self.batch = batch
+        self.mode = mode
+        self.scale = scale
+        if mode == 'planes':
+            self.buffer = np.zeros((batch, channels, rows, cols), dtype=dtype)
+        else:
+            self.buffer = np.zeros((batch, rows * scale, cols * scale, 3), dtype=np.uint8)
+        # One view per batch slot; write_one always returns this view
+        self.views = list(self.buffer)
+        # Palette index per cell, the working image of rgb mode
+        self.cells = np.zeros((rows, cols), dtype=np.intp)
+        self.pixels = np.zeros((rows, cols, 3), dtype=np.uint8)
+        if mode == 'rgb' and scale > 1:
+            # Every pixel block of a cell, and the cell colour broadcast over it
+            self.blocks = [view.reshape(rows, scale, cols, scale, 3) for view in self.views]
+            self.pixel_blocks = self.pixels[:, None, :, None, :]
+
+    def write(self, states):
+        # Fill the buffer from a sequence of at most batch states
+        for index, state in enumerate(states):
+            self.write_one(state, index)
+        return self.buffer
+
+    def _write_rgb(self, palette, index):
+        if self.scale == 1:
+            palette.take(self.cells, axis=0, out=self.views[index])
+            return
+        palette.take(self.cells, axis=0, out=self.pixels)
+        self.blocks[index][:] = self.pixel_blocks
+
+
+class TetrisObserver(Observer):
+    def __init__(self, batch=1, mode='planes', scale=1, dtype=np.float32):
+        cols = tetris_engine.COLUMNS + (TETRIS_SIDEBAR if mode == 'rgb' else 0)
+        super().__init__(batch, mode, len(TETRIS_PLANES), tetris_engine.ROWS, cols, scale, dtype)
+        self.board = self.cells[:, :tetris_engine.COLUMNS]
+        # BitBoard rows, copied across each row so that the shift runs on
+        # full-size operands (a broadcasting ufunc allocates a buffer), and
+        # the cells unpacked from them
+        shape = (tetris_engine.ROWS, tetris_engine.COLUMNS)
+        self.masks = np.zeros(tetris_engine.ROWS, dtype=np.int64)
+        self.mask_rows = np.zeros(shape, dtype=np.int64)
+        self.bits = np.zeros(shape, dtype=np.int64)
+        self.shifts = np.tile(np.arange(tetris_engine.COLUMNS), (tetris_engine.ROWS, 1))
+
+    def filled(self, board):
+        # 1 in self.bits where the BitBoard has a block, 0 elsewhere
+        self.masks[:] = board.rows
+        np.copyto(self.mask_rows, self.masks[:, None])
+        np.right_shift(self.mask_rows, self.shifts, out=self.bits)
+        np.bitwise_and(self.bits, 1, out=self.bits)
+        return self.bits
+
+    def write_one(self, state, index=0):
+        # Board, active piece, ghost and next piece of a TetrisState
+        board = self.board
+        piece = state.current_piece
+        cells = tetris_engine.ROTATION_INFO[piece.type_id][piece.rotation].cells
+        ghost_y = piece.y + ghost_distance(state)
+        next_cells = SPAWN_CELLS[state.next_piece.type_id]
+
+        if self.mode == 'planes':
+            planes = self.views[index]
+            if state.board is not None:
+                np.copyto(planes[0], self.filled(state.board), casting='unsafe')
+            else:
+                board[:] = state.grid
+                np.not_equal(board, 0, out=planes[0], casting='unsafe')
+            planes[1:] = 0
+            for x, y in cells:
+                if y + piece.y >= 0:
+                    planes[1, piece.y + y, piece.x + x] = 1
+                planes[2, ghost_y + y, piece.x + x] = 1
+            for x, y in next_cells:
+                planes[3, y, x] = 1
+            return planes
+
+        board[:] = state.grid  # cells hold type_id + 1, 0 when empty
+        self.cells[:, tetris_engine.COLUMNS:] = 0
+        for x, y in cells:
+            if not board[ghost_y + y, piece.x + x]:
+                board[ghost_y + y, piece.x + x] = GHOST
+        for x, y in cells:
+            if y + piece.y >= 0:
+                board[piece.y + y, piece.x + x] = piece.type_id + 1
+        # The next piece sits one cell in from the sidebar's top left corner
+        next_type = state.next_piece.type_id
+        for x, y in tetris_engine.ROTATION_INFO[next_type][0].cells:
+            self.cells[y + 1, tetris_engine.COLUMNS + 1 + x] = next_type + 1
+        self._write_rgb(TETRIS_PALETTE, index)
+        return self.views[index]
+
+    def write_batch_env(self, env):
+        # Planes for a BatchTetris in one pass: its boards, the piece to
+        # place at its spawn position as 'piece' and the following one as
+        # 'next'. There is no falling piece, so 'ghost' stays empty.
+        if self.mode != 'planes':
+            raise ValueError("write_batch_env fills planes observers only")
+        planes = self.buffer[:env.n]
+        np.not_equal(env.boards, 0, out=planes[:, 0], casting='unsafe')
+        planes[:, 1:] = 0
+        for type_id, cells in enumerate(SPAWN_CELLS):
+            for channel, pieces in ((1, env.pieces), (3, env.next_pieces)):
+                boards = np.flatnonzero(pieces == type_id)
+                if len(boards):
+                    for x, y in cells:
+                        planes[boards, channel, y, x] = 1
+        return planes
+
+
+def ghost_distance(state):
+    # Rows the current piece can still fall
+    piece = state.current_piece
+    if state.board is not None:
+        return state.board.drop_distance(piece)
+    distance = 0
+    while not piece.collision(state.grid, 0, distance + 1):
+        distance += 1
+    return distance
+
+
+class JoltzsiObserver(Observer):
+    def __init__(self, batch=1, mode='planes', scale=1, dtype=np.float32):
+        size = joltzsi_engine.GRID_SIZE
+        super().__init__(batch, mode, len(JOLTZSI_PLANES), size, size, scale, dtype)
+        # Rows of the packed board copied across each row, as in
+        # TetrisObserver, and the cell shifts within a row
+        self.words = np.zeros(size, dtype=np.intp)
+        self.word_rows = np.zeros((size, size), dtype=np.intp)
+        self.shifts = np.tile(np.arange(size) * packed.CELL_BITS, (size, 1))
+        # The cells once per value plane, compared against that value
+        self.values = np.tile(np.arange(5).reshape(5, 1, 1), (1, size, size))
+        self.value_cells = np.zeros((5, size, size), dtype=np.intp)
+        self.one_hot = np.zeros((5, size, size), dtype=bool)
+
+    def unpack(self, state):
+        # Cell values of state into self.cells, from its packed board
+        cells = self.cells
+        if state.game_over:
+            # The overflowing placement that ended the game is only on the grid
+            cells[:] = state.grid
+            return
+        board = state.board
+        words = self.words
+        for y in range(joltzsi_engine.GRID_SIZE):
+            words[y] = board >> packed.ROW_BITS * y & packed.ROW_MASK
+        np.copyto(self.word_rows, words[:, None])
+        np.right_shift(self.word_rows, self.shifts, out=cells)
+        np.bitwise_and(cells, packed.CELL_MASK, out=cells)
+
+    def write_one(self, state, index=0):
+        # Value grid and the current piece at its position of a JoltzsiState
+        cells = self.cells
+        self.unpack(state)
+        size = joltzsi_engine.GRID_SIZE
+
+        if self.mode == 'planes':
+            planes = self.views[index]
+            np.copyto(self.value_cells, cells)
+            np.equal(self.value_cells, self.values, out=self.one_hot)
+            np.copyto(planes[:5], self.one_hot, casting='unsafe')
+            planes[5] = 0
+            for dx, dy in state.current_piece:
+                x = state.piece_x + dx
+                y = state.piece_y + dy
+                if 0 <= x < size and 0 <= y < size:
+                    planes[5, y, x] = 1
+            return planes
+
+        np.minimum(cells, OVERFLOW, out=cells)
+        for dx, dy in state.current_piece:
+            x = state.piece_x + dx
+            y = state.piece_y + dy
+            if 0 <= x < size and 0 <= y < size:
+                cells[y, x] = HIGHLIGHT
+        self._write_rgb(JOLTZSI_PALETTE, index)
+        return self.views[index]
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Import path setup shared by every entry point. The games' modules live in
+# tetris/ and joltzsi/ and the shared ones in common/, with no package above
+# them, so importing this module puts all three directories on sys.path,
+# each once. The front ends first add common/ themselves to reach it.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIES = ('common', 'tetris', 'joltzsi')
+
+for _directory in DIRECTORIES:
+    _path = os.path.join(ROOT, _directory)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
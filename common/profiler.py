@@ -0,0 +1,150 @@
+import json
+import os
+import time
+from array import array
+from datetime import datetime
+
+import pygame
+
+# Per-phase frame timings for the game loops. The loop calls mark(phase) as
+# each phase finishes and end_frame() once per frame; the time since the
+# previous mark is charged to the phase. The last FRAMES frames are kept in a
+# ring buffer of doubles, so recording allocates nothing per frame, and a
+# disabled profiler returns from every call straight away.
+#
+# F3 toggles recording and the overlay, F4 writes the buffered frames as a
+# Chrome trace (open in chrome://tracing or ui.perfetto.dev).
+
+PHASES = ('wait', 'input', 'update', 'animation', 'render', 'present')
+WAIT, INPUT, UPDATE, ANIMATION, RENDER, PRESENT = range(len(PHASES))
+
+FRAMES = 600  # ten seconds at 60 FPS
+OVERLAY_REFRESH_MS = 250
+TRACE_DIR = 'profiles'
+OVERLAY_FONT = ('monospace', 14)  # (name, size) for assets.FONTS
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an ascending list
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class FrameProfiler:
+    def __init__(self, enabled=False, frames=FRAMES):
+        self.frames = frames
+        self.starts = array('d', bytes(8 * frames))  # frame start, seconds
+        self.times = array('d', bytes(8 * frames * len(PHASES)))  # ms per phase
+        self.durations = array('d', bytes(8 * frames))  # ms per frame
+        self.count = 0  # frames recorded since the buffer was cleared
+        self.slot = 0
+        self.enabled = False
+        self.overlay_lines = []
+        self.overlay_time = 0.0
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        # Recording restarts from an empty buffer
+        self.enabled = True
+        self.count = 0
+        self.slot = 0
+        for i in range(len(PHASES)):
+            self.times[i] = 0.0
+        self.frame_start = self.last = time.perf_counter()
+
+    def disable(self):
+        self.enabled = False
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.times[self.slot * len(PHASES) + phase] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        # Close the current frame and start the next one
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        slot = self.slot
+        self.starts[slot] = self.frame_start
+        self.durations[slot] = (now - self.frame_start) * 1000
+        self.count += 1
+        self.slot = slot = (slot + 1) % self.frames
+        base = slot * len(PHASES)
+        for i in range(len(PHASES)):
+            self.times[base + i] = 0.0
+        self.frame_start = self.last = now
+
+    def recorded(self):
+        # Ring slots holding complete frames, oldest first
+        if self.count < self.frames:
+            return list(range(self.count))
+        return [(self.slot + i) % self.frames for i in range(self.frames)]
+
+    def stats(self):
+        # {'frame': (p50, p95, p99), phase: (p50, p95, p99), ...} in ms
+        slots = self.recorded()
+        result = {}
+        durations = sorted(self.durations[slot] for slot in slots)
+        result['frame'] = tuple(percentile(durations, p) for p in (0.5, 0.95, 0.99))
+        for phase, name in enumerate(PHASES):
+            values = sorted(self.times[slot * len(PHASES) + phase] for slot in slots)
+            result[name] = tuple(percentile(values, p) for p in (0.5, 0.95, 0.99))
+        return result
+
+    def draw_overlay(self, surface, font, position=(5, 5)):
+        # Draw the percentile table; returns the rect drawn, or None when off
+        if not self.enabled:
+            return None
+        now = time.perf_counter()
+        if not self.overlay_lines or (now - self.overlay_time) * 1000 >= OVERLAY_REFRESH_MS:
+            self.overlay_time = now
+            lines = ["ms        p50    p95    p99"]
+            for name, (p50, p95, p99) in self.stats().items():
+                lines.append(f"{name:<9}{p50:>6.1f} {p95:>6.1f} {p99:>6.1f}")
+            self.overlay_lines = [font.render(line, True, (255, 255, 255)) for line in lines]
+
+        line_height = font.get_linesize()
+        width = max(text.get_width() for text in self.overlay_lines) + 10
+        rect = pygame.Rect(position, (width, line_height * len(self.overlay_lines) + 10))
+        surface.fill((0, 0, 0), rect)
+        for i, text in enumerate(self.overlay_lines):
+            surface.blit(text, (rect.x + 5, rect.y + 5 + i * line_height))
+        return rect
+
+    def export_trace(self, path):
+        # Chrome trace event format: one complete event per frame and per phase
+        events = []
+        slots = self.recorded()
+        origin = self.starts[slots[0]] if slots else 0.0
+        for slot in slots:
+            start = (self.starts[slot] - origin) * 1e6
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': start, 'dur': self.durations[slot] * 1000})
+            offset = start
+            for phase, name in enumerate(PHASES):
+                duration = self.times[slot * len(PHASES) + phase] * 1000
+                if duration:
+                    events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': 1,
+                                   'ts': offset, 'dur': duration})
+                offset += duration
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return path
+
+    def export_default(self, game, directory=TRACE_DIR):
+        # profiles/<game>-<date>.trace.json under the current directory
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return self.export_trace(os.path.join(directory, f"{game}-{stamp}.trace.json"))
@@ -0,0 +1,204 @@
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+# Deterministic game recordings. A game is fully described by the seed of its
+# random.Random and, per frame, how far the frame advanced the game and the
+# inputs seen that frame: TetrisController and JoltzsiController turn exactly
+# those into game state, so replaying the frames through a fresh controller
+# reproduces the game without pygame. Tetris frames advance by a number of
+# TICK_MS simulation ticks, Joltzsi frames by their frame time in ms.
+#
+#   header   magic, game id, seed, frame count, final score, game over flag
+#   body     zlib of one varint per frame, (advance << 1) | has_inputs,
+#            followed when inputs were seen by a varint count and one byte
+#            per input
+#
+# An idle frame costs one byte before compression, so an hour of play is a
+# few kB on disk.
+#
+#   python common/replay.py tetris/replays/*.replay
+#   python tetris/main.py --replay FILE --speed 4    (render at 4x)
+
+import paths
+
+import tetris_engine
+import joltzsi_engine
+from bitboard import BitBoard
+from clock import VirtualClock
+
+MAGIC = b'REPLAY02'  # 01 recorded Tetris frames in ms rather than ticks
+HEADER = struct.Struct('<BQQd?')  # game id, seed, frames, final score, game over
+
+GAME_IDS = {'tetris': 0, 'joltzsi': 1}
+GAME_NAMES = {game_id: name for name, game_id in GAME_IDS.items()}
+
+REPLAY_DIR = 'replays'
+EXTENSION = '.replay'
+
+Replay = namedtuple('Replay', ['game', 'seed', 'frames', 'score', 'game_over'])
+
+
+# Inputs are stored as one byte each. Tetris inputs are (pressed, action)
+# pairs for key down and key up; Joltzsi inputs are key presses only.
+def encode_tetris_input(event):
+    pressed, action = event
+    return action << 1 | pressed
+
+
+def decode_tetris_input(code):
+    return bool(code & 1), code >> 1
+
+
+CODECS = {
+    'tetris': (encode_tetris_input, decode_tetris_input),
+    'joltzsi': (int, int),
+}
+
+
+def new_seed():
+    return int.from_bytes(os.urandom(8), 'little') >> 1
+
+
+def new_session(game, seed, clock=None):
+    # (state, controller) for a fresh game; every front end and the
+    # replayer build their games here so the piece sequences line up.
+    # Joltzsi games run on clock, a VirtualClock unless one is given.
+    rng = random.Random(seed)
+    if game == 'tetris':
+        state = tetris_engine.TetrisState(BitBoard(), rng)
+        return state, tetris_engine.TetrisController(state)
+    state = joltzsi_engine.JoltzsiState(rng)
+    return state, joltzsi_engine.JoltzsiController(state, clock or VirtualClock())
+
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Recorder:
+    def __init__(self, game, seed):
+        self.game = game
+        self.seed = seed
+        self.encode = CODECS[game][0]
+        self.stream = bytearray()
+        self.frames = 0
+
+    def frame(self, advance, inputs=()):
+        stream = self.stream
+        write_varint(stream, advance << 1 | bool(inputs))
+        if inputs:
+            write_varint(stream, len(inputs))
+            stream.extend(self.encode(event) for event in inputs)
+        self.frames += 1
+
+    def save(self, path, score, game_over):
+        header = HEADER.pack(GAME_IDS[self.game], self.seed, self.frames, score, game_over)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(MAGIC + header + zlib.compress(bytes(self.stream), 9))
+        os.replace(temp_path, path)
+
+    def save_default(self, score, game_over, directory=REPLAY_DIR):
+        # replays/<game>-<date>-<seed>.replay under the current directory
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(directory, f"{self.game}-{stamp}-{self.seed:x}{EXTENSION}")
+        self.save(path, score, game_over)
+        return path
+
+
+def load(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        if data.startswith(MAGIC[:6]):
+            raise ValueError(f"{path} was recorded in an older replay format")
+        raise ValueError(f"{path} is not a replay")
+    game_id, seed, frame_count, score, game_over = HEADER.unpack_from(data, len(MAGIC))
+    game = GAME_NAMES[game_id]
+    decode = CODECS[game][1]
+    stream = zlib.decompress(data[len(MAGIC) + HEADER.size:])
+
+    frames = []
+    pos = 0
+    for _ in range(frame_count):
+        value, pos = read_varint(stream, pos)
+        inputs = ()
+        if value & 1:
+            count, pos = read_varint(stream, pos)
+            inputs = [decode(code) for code in stream[pos:pos + count]]
+            pos += count
+        frames.append((value >> 1, inputs))
+    return Replay(game, seed, frames, score, game_over)
+
+
+def simulate(replay):
+    # Re-run the recording headlessly as fast as the engine goes; returns the
+    # final state
+    state, controller = new_session(replay.game, replay.seed)
+    frame = controller.frame
+    if replay.game == 'tetris':
+        for ticks, inputs in replay.frames:
+            frame(ticks, inputs)
+    else:
+        clock = controller.clock
+        for dt, inputs in replay.frames:
+            clock.advance(dt)
+            frame(inputs)
+    return state
+
+
+def game_time(replay):
+    # Play time covered by the recording, in ms
+    total = sum(advance for advance, _ in replay.frames)
+    if replay.game == 'tetris':
+        total *= tetris_engine.TICK_MS
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-simulate recorded games headlessly")
+    parser.add_argument('replays', nargs='+')
+    args = parser.parse_args()
+
+    mismatches = 0
+    for path in args.replays:
+        replay = load(path)
+        start = time.perf_counter()
+        state = simulate(replay)
+        elapsed = time.perf_counter() - start
+        game_seconds = game_time(replay) / 1000
+        ok = state.score == replay.score and state.game_over == replay.game_over
+        mismatches += not ok
+        print(f"{path}: {replay.game} seed {replay.seed:x}, {len(replay.frames)} frames, "
+              f"score {state.score} ({'ok' if ok else f'recorded {replay.score}'}), "
+              f"{game_seconds:.0f}s of play in {elapsed * 1000:.1f}ms "
+              f"({game_seconds / max(elapsed, 1e-9):,.0f}x real time)")
+    if mismatches:
+        sys.exit(f"{mismatches} replay(s) did not reproduce their recorded score")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from collections import namedtuple
+from functools import partial
+
+# Runs headless Tetris and Joltzsi games on a process pool and streams the
+# results back as each game finishes. Every job carries its own seed, so a
+# game replays identically no matter which worker picks it up.
+#
+#   python common/rollout.py --game tetris --games 10000 --workers 32
+
+import paths
+
+import tetris_engine
+import joltzsi_engine
+from agent import AgentPolicy
+from bitboard import BitBoard
+
+Job = namedtuple('Job', ['game', 'seed', 'policy'])
+GameResult = namedtuple('GameResult', [
+    'game', 'seed', 'policy', 'score', 'lines', 'level', 'steps', 'seconds', 'worker'
+])
+
+
+def tetris_random(state, rng):
+    return rng.choice(tetris_engine.ACTIONS)
+
+
+def tetris_drop(state, rng):
+    return tetris_engine.DOWN
+
+
+def joltzsi_random(state, rng):
+    return rng.choice(joltzsi_engine.legal_moves(state.current_piece))
+
+
+def stateless(policy):
+    # Factory for a policy that keeps nothing between calls
+    return lambda: policy
+
+
+# Policy factories, looked up by name so jobs stay cheap to pickle. Every job
+# builds its own policy, so nothing one game leaves behind (the agent's
+# transposition table, say) reaches the next game a worker plays.
+POLICIES = {
+    'tetris': {'random': stateless(tetris_random), 'drop': stateless(tetris_drop),
+               'heuristic': AgentPolicy},
+    'joltzsi': {'random': stateless(joltzsi_random)},
+}
+
+
+def play_tetris(seed, policy, max_steps):
+    state = tetris_engine.TetrisState(BitBoard(), random.Random(seed))
+    policy_rng = random.Random(f'{seed}:policy')
+    steps = 0
+    while not state.game_over and steps < max_steps:
+        state.step(policy(state, policy_rng))
+        steps += 1
+    return state.score, state.lines_cleared, state.level, steps
+
+
+def play_joltzsi(seed, policy, max_steps):
+    # Placements are instant, so every piece earns the full time bonus
+    state = joltzsi_engine.JoltzsiState(random.Random(seed))
+    policy_rng = random.Random(f'{seed}:policy')
+    steps = 0
+    while not state.game_over and steps < max_steps:
+        state.step(*policy(state, policy_rng))
+        steps += 1
+    return state.score, state.lines_cleared, state.level, steps
+
+
+GAMES = {'tetris': play_tetris, 'joltzsi': play_joltzsi}
+
+
+def run_job(job, max_steps=100000):
+    start = time.perf_counter()
+    policy = POLICIES[job.game][job.policy]()
+    score, lines, level, steps = GAMES[job.game](job.seed, policy, max_steps)
+    return GameResult(job.game, job.seed, job.policy, score, lines, level, steps,
+                      time.perf_counter() - start, os.getpid())
+
+
+def make_jobs(game, policy, games, base_seed=0):
+    return [Job(game, base_seed + i, policy) for i in range(games)]
+
+
+def run_rollouts(jobs, workers=None, chunksize=None, max_steps=100000):
+    # Yields a GameResult per job in completion order. Jobs are handed out in
+    # chunks so that short games do not spend their time on pool round trips.
+    jobs = list(jobs)
+    workers = workers or os.cpu_count()
+    play = partial(run_job, max_steps=max_steps)
+    if workers == 1:
+        for job in jobs:
+            yield play(job)
+        return
+    if chunksize is None:
+        chunksize = max(1, len(jobs) // (workers * 8))
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(play, jobs, chunksize)
+
+
+def measure_scaling(game, policy, games, max_workers):
+    # Games per second for 1, 2, 4, ... workers on the same job list
+    jobs = make_jobs(game, policy, games)
+    results = []
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        for _ in run_rollouts(jobs, workers):
+            pass
+        results.append((workers, games / (time.perf_counter() - start)))
+        workers *= 2
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless games on a process pool")
+    parser.add_argument('--game', choices=sorted(GAMES), default='tetris')
+    parser.add_argument('--policy', default='random')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first game")
+    parser.add_argument('--max-steps', type=int, default=100000)
+    parser.add_argument('--scaling', action='store_true',
+                        help="report games/s for 1, 2, 4, ... up to --workers")
+    args = parser.parse_args()
+
+    if args.policy not in POLICIES[args.game]:
+        parser.error(f"unknown policy {args.policy!r} for {args.game}")
+
+    if args.scaling:
+        for workers, rate in measure_scaling(args.game, args.policy, args.games, args.workers):
+            print(f"{workers:>3} workers: {rate:>10,.0f} games/s")
+        return
+
+    jobs = make_jobs(args.game, args.policy, args.games, args.seed)
+    start = time.perf_counter()
+    total_score = 0
+    total_steps = 0
+    for result in run_rollouts(jobs, args.workers, max_steps=args.max_steps):
+        total_score += result.score
+        total_steps += result.steps
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} {args.game} games in {elapsed:.2f}s "
+          f"({args.games / elapsed:,.0f} games/s, {total_steps / elapsed:,.0f} steps/s)")
+    print(f"Mean score: {total_score / args.games:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import csv
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# High-score store used by both games in place of rewriting the whole CSV on
+# every game over.
+#
+#   <name>.log   append-only records of (score, unix time, crc32). A record is
+#                written with a single call under an exclusive file lock, and a
+#                torn record left by a crash fails its CRC and is cut off by
+#                the next writer.
+#   <name>.idx   snapshot of every score in sorted order plus the top entries
+#                and how much of the log it covers. It is only a cache: it is
+#                replaced atomically and rebuilt from the log if it is missing,
+#                damaged or covers more than the log holds.
+#
+# Opening loads the snapshot and replays the log tail after it. Adding a score
+# or asking for a rank is a bisect into the sorted scores.
+#
+#   python common/score_store.py migrate tetris/tetris_scores.csv tetris/tetris_scores
+#   python common/score_store.py top tetris/tetris_scores
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+LOG_MAGIC = b'SCORLOG1'
+INDEX_MAGIC = b'SCORIDX1'
+RECORD = struct.Struct('<qqI')  # score, timestamp, crc32 of the first 16 bytes
+ENTRY = struct.Struct('<qq')
+INDEX_HEADER = struct.Struct('<QQI')  # log offset covered, score count, top count
+CRC = struct.Struct('<I')
+
+TOP_K = 10
+COMPACT_EVERY = 4096  # records in the log tail before the snapshot is rewritten
+
+
+def pack_record(score, timestamp):
+    entry = ENTRY.pack(score, timestamp)
+    return entry + CRC.pack(zlib.crc32(entry))
+
+
+@contextmanager
+def locked(path):
+    # Exclusive lock shared by every process using the same store
+    with open(path, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def format_date(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime(DATE_FORMAT)
+
+
+def parse_date(text):
+    return int(datetime.strptime(text, DATE_FORMAT).timestamp())
+
+
+class ScoreStore:
+    def __init__(self, path, top_k=TOP_K, legacy_csv=None):
+        # path is the store name without extension. legacy_csv names an old
+        # ranked CSV to import the first time the store is created.
+        self.path = path
+        self.log_path = path + '.log'
+        self.index_path = path + '.idx'
+        self.lock_path = path + '.lock'
+        self.top_k = top_k
+        self.scores = []  # ascending
+        self.top_entries = []  # (score, timestamp), best first, older first among ties
+        self.offset = len(LOG_MAGIC)
+        self.unindexed = 0
+
+        if not os.path.exists(self.log_path):
+            with locked(self.lock_path):
+                if not os.path.exists(self.log_path):
+                    self._create(legacy_csv)
+        self._load_index()
+        self.refresh()
+
+    def _create(self, legacy_csv):
+        records = []
+        if legacy_csv and os.path.exists(legacy_csv):
+            records = [pack_record(score, timestamp) for score, timestamp in read_csv(legacy_csv)]
+        # Build the log under a temporary name so a crash never leaves half of it
+        temp_path = self.log_path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(LOG_MAGIC + b''.join(records))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.log_path)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return
+        body, checksum = data[:-CRC.size], data[-CRC.size:]
+        if not body.startswith(INDEX_MAGIC) or CRC.pack(zlib.crc32(body)) != checksum:
+            return  # Damaged snapshot, rebuild from the log
+        pos = len(INDEX_MAGIC)
+        offset, count, top_count = INDEX_HEADER.unpack_from(body, pos)
+        pos += INDEX_HEADER.size
+        if top_count < min(self.top_k, count):
+            return  # Written with a smaller top_k, rebuild from the log
+        log_size = os.path.getsize(self.log_path)
+        if offset > log_size or (offset - len(LOG_MAGIC)) % RECORD.size:
+            return  # Covers a log that has since been replaced, rebuild from it
+        top_entries = [ENTRY.unpack_from(body, pos + i * ENTRY.size) for i in range(top_count)]
+        pos += top_count * ENTRY.size
+        scores = array('q')
+        scores.frombytes(body[pos:pos + count * scores.itemsize])
+        if sys.byteorder != 'little':
+            scores.byteswap()
+        self.scores = scores.tolist()
+        self.top_entries = top_entries[:self.top_k]
+        self.offset = offset
+
+    def _insert_top(self, score, timestamp):
+        top = self.top_entries
+        if len(top) < self.top_k or score > top[-1][0]:
+            position = len(top)
+            while position and top[position - 1][0] < score:
+                position -= 1
+            top.insert(position, (score, timestamp))
+            del top[self.top_k:]
+
+    def refresh(self):
+        # Pick up records appended since the last read, including other processes'
+        with open(self.log_path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read()
+        usable = len(data) - len(data) % RECORD.size
+        fresh = []
+        for pos in range(0, usable, RECORD.size):
+            score, timestamp, checksum = RECORD.unpack_from(data, pos)
+            if zlib.crc32(data[pos:pos + ENTRY.size]) != checksum:
+                break  # Torn write at the tail; the next writer truncates it
+            fresh.append((score, timestamp))
+        self.offset += len(fresh) * RECORD.size
+        self.unindexed += len(fresh)
+        if len(fresh) > 64:
+            self.scores.extend(score for score, _ in fresh)
+            self.scores.sort()
+        else:
+            for score, _ in fresh:
+                insort(self.scores, score)
+        for score, timestamp in fresh:
+            self._insert_top(score, timestamp)
+
+    def add(self, score, timestamp=None):
+        # Append a score and return its rank, counted like the old CSVs: ties
+        # rank below the scores that were there first
+        if timestamp is None:
+            timestamp = int(time.time())
+        with locked(self.lock_path):
+            self.refresh()
+            rank = self.rank(score)
+            with open(self.log_path, 'r+b') as file:
+                # Holding the lock, anything past the last good record is a
+                # torn write from a crashed writer
+                if file.seek(0, os.SEEK_END) > self.offset:
+                    file.truncate(self.offset)
+                    file.seek(self.offset)
+                file.write(pack_record(score, timestamp))
+                file.flush()
+                os.fsync(file.fileno())
+            self.refresh()
+            if self.unindexed >= COMPACT_EVERY:
+                self._write_index()
+        return rank
+
+    def rank(self, score):
+        # Rank a new score would get: one below every stored score >= it
+        return len(self.scores) - bisect_left(self.scores, score) + 1
+
+    def top(self, k=None):
+        # [(rank, score, date)] of the best k scores
+        entries = self.top_entries[:k or self.top_k]
+        return [(i, score, format_date(timestamp)) for i, (score, timestamp) in enumerate(entries, start=1)]
+
+    def __len__(self):
+        return len(self.scores)
+
+    def compact(self):
+        with locked(self.lock_path):
+            self.refresh()
+            self._write_index()
+
+    def _write_index(self):
+        scores = array('q', self.scores)
+        if sys.byteorder != 'little':
+            scores.byteswap()
+        body = b''.join([
+            INDEX_MAGIC,
+            INDEX_HEADER.pack(self.offset, len(scores), len(self.top_entries)),
+            b''.join(ENTRY.pack(score, timestamp) for score, timestamp in self.top_entries),
+            scores.tobytes(),
+        ])
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(body + CRC.pack(zlib.crc32(body)))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.index_path)
+        self.unindexed = 0
+
+    def export_csv(self, csv_path):
+        # Write the full ranked table in the old Rank,Score,Date layout
+        entries = []
+        with open(self.log_path, 'rb') as file:
+            data = file.read()[len(LOG_MAGIC):]
+        for pos in range(0, len(data) - len(data) % RECORD.size, RECORD.size):
+            score, timestamp, checksum = RECORD.unpack_from(data, pos)
+            if zlib.crc32(data[pos:pos + ENTRY.size]) != checksum:
+                break
+            entries.append((score, timestamp))
+        entries.sort(key=lambda x: x[0], reverse=True)
+        with open(csv_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Rank', 'Score', 'Date'])
+            for i, (score, timestamp) in enumerate(entries, start=1):
+                writer.writerow([i, score, format_date(timestamp)])
+
+
+def read_csv(csv_path):
+    # (score, timestamp) rows of an old Rank,Score,Date file, in rank order
+    with open(csv_path, 'r', newline='') as file:
+        reader = csv.DictReader(file)
+        return [(int(row['Score']), parse_date(row['Date'])) for row in reader]
+
+
+def migrate_csv(csv_path, path):
+    # Import an old CSV into a new store; refuses to touch an existing store
+    if os.path.exists(path + '.log'):
+        raise FileExistsError(f"{path}.log already exists")
+    store = ScoreStore(path, legacy_csv=csv_path)
+    store.compact()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or migrate a high-score store")
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate = commands.add_parser('migrate', help="import a Rank,Score,Date CSV")
+    migrate.add_argument('csv')
+    migrate.add_argument('store')
+    top = commands.add_parser('top', help="print the best scores")
+    top.add_argument('store')
+    top.add_argument('-k', type=int, default=TOP_K)
+    export = commands.add_parser('export', help="write the ranked table as CSV")
+    export.add_argument('store')
+    export.add_argument('csv')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        store = migrate_csv(args.csv, args.store)
+        print(f"Imported {len(store)} scores into {args.store}")
+    elif args.command == 'top':
+        store = ScoreStore(args.store, top_k=args.k)
+        for rank, score, date in store.top(args.k):
+            print(f"{rank:>3}  {score:>10}  {date}")
+    elif args.command == 'export':
+        ScoreStore(args.store).export_csv(args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import multiprocessing
+import os
+import random
+import signal
+import time
+
+import packed
+from joltzsi_engine import legal_moves, line_clear_score, placement_mask, random_piece
+
+# Placement hints from Monte Carlo rollouts on a process pool. Every legal
+# move of the current piece is played out many times: the move, then the
+# known next piece, then DEPTH - 1 pieces from random_piece, each placed on
+# the first line clear available or at random otherwise. Moves are ranked by
+# their mean score.
+#
+# The game loop calls update() once a frame. It only hands small tasks to the
+# pool and collects finished ones, so it never waits on a worker. The answer
+# refines while the player thinks, until the piece's time limit runs out or
+# every move has MAX_ROLLOUTS playouts. A new piece drops the pending work for
+# the old one, and tasks are kept short so stale ones drain within a frame or
+# two.
+
+DEPTH = 6  # pieces per playout, the candidate move included
+ROLLOUTS_PER_TASK = 16
+MAX_ROLLOUTS = 1024  # per move
+TASKS_PER_WORKER = 2  # kept in flight so workers never idle between frames
+WORKER_NICENESS = 10  # workers yield the CPU to the game loop
+
+
+def place(board, move, level):
+    # (board after the move and its clears, points) or (None, 0) on overflow
+    board = packed.add_cells(board, placement_mask(*move))
+    if board is None:
+        return None, 0
+    points = 1
+    rows, cols, rows_values, cols_values = packed.find_lines(board)
+    if rows or cols:
+        points += line_clear_score(rows_values, cols_values, level)
+        board = packed.clear_lines(board, rows, cols)
+    return board, points
+
+
+def playout(board, level, next_piece, rng, depth):
+    # Points from depth - 1 more pieces, the first of them next_piece
+    total = 0
+    piece = next_piece
+    for _ in range(depth - 1):
+        best_board, best_points = None, 0
+        moves = legal_moves(piece)
+        for move in rng.sample(moves, len(moves)):
+            after, points = place(board, move, level)
+            if after is not None and (best_board is None or points > best_points):
+                best_board, best_points = after, points
+        if best_board is None:
+            break  # every move overflows: game over
+        board = best_board
+        total += best_points
+        piece = random_piece(rng)
+    return total
+
+
+def init_worker():
+    # Ctrl+C reaches the whole process group; only the game acts on it, by
+    # closing the pool. Pool.terminate stops workers with SIGTERM, so its
+    # default action is restored: main() forks the pool before the window
+    # opens, but a caller that initialised pygame first would hand the
+    # workers SDL's handler and terminate would not stop them.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.nice(WORKER_NICENESS)
+
+
+def evaluate(job):
+    # Summed playout score of one candidate move; runs in the workers
+    board, level, move, next_piece, seed, rollouts, depth = job
+    rng = random.Random(seed)
+    after, points = place(board, move, level)
+    if after is None:
+        return 0
+    return sum(points + playout(after, level, next_piece, rng, depth) for _ in range(rollouts))
+
+
+class Advisor:
+    def __init__(self, workers=None, depth=DEPTH, rollouts=ROLLOUTS_PER_TASK):
+        # One core is left to the game loop
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.pool = multiprocessing.Pool(self.workers, initializer=init_worker)
+        self.depth = depth
+        self.rollouts = rollouts
+        self.position = None
+        self.moves = []
+        self.totals = []
+        self.counts = []
+        self.pending = []  # (move index, AsyncResult)
+        self.deadline = 0.0
+        self.submitted = 0
+
+    def start(self, state):
+        # Advise on the current piece of state from scratch
+        self.position = (state.board, state.pieces_placed)
+        self.moves = list(legal_moves(state.current_piece))
+        self.totals = [0] * len(self.moves)
+        self.counts = [0] * len(self.moves)
+        self.pending = []
+        self.deadline = time.perf_counter() + state.time_limit() / 1000
+        for index, move in enumerate(self.moves):
+            if place(state.board, move, state.level)[0] is None:
+                self.counts[index] = MAX_ROLLOUTS  # known to end the game
+
+    def update(self, state):
+        # Collect finished playouts and top up the pool; never blocks
+        if state.game_over:
+            self.pending = []
+            return
+        if self.position != (state.board, state.pieces_placed):
+            self.start(state)
+
+        still_pending = []
+        for index, result in self.pending:
+            if result.ready():
+                self.totals[index] += result.get()
+                self.counts[index] += self.rollouts
+            else:
+                still_pending.append((index, result))
+        self.pending = still_pending
+
+        if time.perf_counter() >= self.deadline:
+            return
+        in_flight = [0] * len(self.moves)
+        for index, _ in self.pending:
+            in_flight[index] += self.rollouts
+        while len(self.pending) < self.workers * TASKS_PER_WORKER:
+            # The move with the fewest playouts done or under way goes next
+            index = min(range(len(self.moves)), key=lambda i: self.counts[i] + in_flight[i])
+            if self.counts[index] + in_flight[index] >= MAX_ROLLOUTS:
+                break
+            self.submitted += 1
+            job = (state.board, state.level, self.moves[index], state.next_piece,
+                   f'{state.board}:{self.submitted}', self.rollouts, self.depth)
+            self.pending.append((index, self.pool.apply_async(evaluate, (job,))))
+            in_flight[index] += self.rollouts
+
+    @property
+    def best(self):
+        # (piece, x, y) with the highest mean playout score so far, or None
+        # until a playout has come back
+        best, best_mean = None, -1.0
+        for move, total, count in zip(self.moves, self.totals, self.counts):
+            if count and total / count > best_mean:
+                best, best_mean = move, total / count
+        return best if best_mean > 0 else None
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
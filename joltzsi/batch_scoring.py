@@ -0,0 +1,152 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from joltzsi_engine import GRID_SIZE, TETROMINOS, legal_moves, score_table
+
+# Joltzsi placements scored for N boards at once. Boards are an (N, GRID_SIZE,
+# GRID_SIZE) integer array of cell values and pieces are given by their cells;
+# evaluate() stacks the pieces on, detects overflow, finds full rows and
+# columns and scores them with line_clear_score's formula, all without a
+# Python loop over boards. Every step is the scalar one done in float64 in the
+# same order, so boards and points match joltzsi_engine exactly.
+
+PIECE_COUNT = len(TETROMINOS)
+
+# score_table by lines cleared; five lines are not in the table and score 0
+BASE_POINTS = np.array([score_table.get(n, 0) for n in range(GRID_SIZE + 1)], dtype=np.int64)
+
+# Board cells of every distinct legal move of each piece, padded to the
+# longest list so moves can be indexed per board: MOVE_X[piece, move, cell]
+MOVES = [legal_moves(piece) for piece in TETROMINOS]
+MOVE_COUNTS = np.array([len(moves) for moves in MOVES])
+MOVE_X = np.zeros((PIECE_COUNT, MOVE_COUNTS.max(), 4), dtype=np.int64)
+MOVE_Y = np.zeros((PIECE_COUNT, MOVE_COUNTS.max(), 4), dtype=np.int64)
+for _piece, _moves in enumerate(MOVES):
+    for _index, (_cells, _x, _y) in enumerate(_moves):
+        MOVE_X[_piece, _index] = [_x + dx for dx, _ in _cells]
+        MOVE_Y[_piece, _index] = [_y + dy for _, dy in _cells]
+
+# Placed boards, per-board overflow flags, the full rows and columns found
+# (N, GRID_SIZE) and the points they scored
+Evaluation = namedtuple('Evaluation', ['boards', 'overflow', 'rows', 'cols', 'points'])
+
+
+def multipliers(averages):
+    # joltzsi_engine.multiplier over an array
+    return np.select(
+        [(averages > 0.99) & (averages <= 1.0),
+         (averages > 1.0) & (averages <= 2.0),
+         (averages > 2.0) & (averages <= 3.0),
+         averages > 3.0],
+        [1, 2, 4, 8],
+        default=1,
+    )
+
+
+def add_pieces(boards, cell_x, cell_y):
+    # Stack one piece on each board, cell by cell like add_piece: once a cell
+    # passes 4 the remaining cells of that piece are not added. Returns the
+    # new boards and the overflow flags.
+    boards = np.array(boards, dtype=np.int64)
+    n = len(boards)
+    board_index = np.arange(n)
+    overflow = np.zeros(n, dtype=bool)
+    for cell in range(cell_x.shape[1]):
+        xs = cell_x[:, cell]
+        ys = cell_y[:, cell]
+        values = boards[board_index, ys, xs] + ~overflow
+        boards[board_index, ys, xs] = values
+        overflow |= values > 4
+    return boards, overflow
+
+
+def find_lines(boards):
+    # Full rows (N, GRID_SIZE) and columns, and the value filling each line
+    row_values = boards[:, :, 0]
+    col_values = boards[:, 0, :]
+    rows = (boards == row_values[:, :, None]).all(axis=2)
+    cols = (boards == col_values[:, None, :]).all(axis=1)
+    rows &= (row_values >= 1) & (row_values <= 4)
+    cols &= (col_values >= 1) & (col_values <= 4)
+    return rows, cols, row_values, col_values
+
+
+def line_clear_scores(rows, cols, row_values, col_values, levels):
+    # joltzsi_engine.line_clear_score for every board, 0.0 where nothing cleared
+    rows_cleared = rows.sum(axis=1)
+    cols_cleared = cols.sum(axis=1)
+    row_sums = np.where(rows, row_values, 0).sum(axis=1)
+    col_sums = np.where(cols, col_values, 0).sum(axis=1)
+    avg_row_value = np.divide(row_sums, rows_cleared, out=np.zeros(len(rows)),
+                              where=rows_cleared > 0)
+    avg_col_value = np.divide(col_sums, cols_cleared, out=np.zeros(len(cols)),
+                              where=cols_cleared > 0)
+
+    row_score = BASE_POINTS[rows_cleared] * multipliers(avg_row_value)
+    col_score = BASE_POINTS[cols_cleared] * multipliers(avg_col_value)
+
+    # (rows + cols) / 2 is a whole or half number, which round(_, 1) keeps
+    both = (rows_cleared > 0) & (cols_cleared > 0)
+    final_multiplier = np.where(both, (rows_cleared + cols_cleared) / 2, 1.0)
+    final_multiplier *= cols_cleared * avg_col_value + rows_cleared * avg_row_value
+
+    total_score = (row_score + col_score) * final_multiplier
+    total_score /= 2
+    total_score *= levels
+    return total_score
+
+
+def evaluate(boards, cell_x, cell_y, levels):
+    # Place the piece with cells (cell_x[b], cell_y[b]) on every board b and
+    # clear what it completes, as JoltzsiState.place does for one board.
+    # Boards that overflow keep their partly added piece and score nothing.
+    boards, overflow = add_pieces(boards, np.asarray(cell_x), np.asarray(cell_y))
+    rows, cols, row_values, col_values = find_lines(boards)
+    rows &= ~overflow[:, None]
+    cols &= ~overflow[:, None]
+    points = line_clear_scores(rows, cols, row_values, col_values, np.asarray(levels))
+    boards[rows[:, :, None] | cols[:, None, :]] = 0
+    return Evaluation(boards, overflow, rows, cols, points)
+
+
+def evaluate_moves(boards, pieces, levels):
+    # Every legal move of piece index pieces[b] on board b, flattened to
+    # N * MOVE_COUNTS.max() boards; reshape the fields to (N, moves, ...).
+    # Moves past MOVE_COUNTS[pieces[b]] are padding and are marked in the
+    # returned (N, moves) valid array.
+    boards = np.asarray(boards)
+    pieces = np.asarray(pieces)
+    n = len(boards)
+    move_count = MOVE_X.shape[1]
+    valid = np.arange(move_count)[None, :] < MOVE_COUNTS[pieces][:, None]
+    expanded = np.repeat(boards, move_count, axis=0)
+    result = evaluate(
+        expanded,
+        MOVE_X[pieces].reshape(n * move_count, 4),
+        MOVE_Y[pieces].reshape(n * move_count, 4),
+        np.repeat(np.asarray(levels), move_count),
+    )
+    return result, valid
+
+
+def measure_throughput(sizes=(1, 16, 256, 4096), repeats=20, seed=0):
+    # Scored placements per second when evaluating every move of N boards
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in sizes:
+        boards = rng.integers(0, 5, (n, GRID_SIZE, GRID_SIZE))
+        pieces = rng.integers(0, PIECE_COUNT, n)
+        levels = rng.integers(1, 30, n)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            evaluate_moves(boards, pieces, levels)
+        elapsed = time.perf_counter() - start
+        results.append((n, MOVE_COUNTS[pieces].sum() * repeats / elapsed))
+    return results
+
+
+if __name__ == "__main__":
+    for n, rate in measure_throughput():
+        print(f"N={n:>5}: {rate:>12,.0f} placements/s")
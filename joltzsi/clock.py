@@ -0,0 +1,46 @@
+import time
+
+# Time sources for JoltzsiController. The timer rules only ever ask now(), in
+# whole milliseconds, so the same game runs against the wall clock in the
+# front end and against a VirtualClock in tests, replays and simulators,
+# where time moves only when advanced and a game takes as long as its moves
+# do to compute.
+
+
+class RealClock:
+    # Wall time since creation, less any time spent paused. The front end
+    # pauses it while a blocking animation plays, so that time is not
+    # charged to the next piece.
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.paused_at = None
+
+    def now(self):
+        current = self.paused_at if self.paused_at is not None else time.perf_counter()
+        return int((current - self.origin) * 1000)
+
+    def pause(self):
+        if self.paused_at is None:
+            self.paused_at = time.perf_counter()
+
+    def resume(self):
+        if self.paused_at is not None:
+            self.origin += time.perf_counter() - self.paused_at
+            self.paused_at = None
+
+
+class VirtualClock:
+    def __init__(self, start=0):
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def advance(self, ms):
+        self.time += ms
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
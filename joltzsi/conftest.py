@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+from joltzsi_engine import GRID_SIZE
+
+# Boards shared by the packed.py and batch_scoring.py tests
+
+
+def random_grid(rng):
+    # Cell values 0-4 with a few lines filled, each full or one short of
+    # full, so that placements complete lines and overflow now and then
+    grid = [[rng.randrange(5) for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+    for _ in range(rng.randrange(4)):
+        value = rng.randrange(1, 5)
+        index = rng.randrange(GRID_SIZE)
+        short = rng.random() < 0.5
+        if rng.random() < 0.5:
+            grid[index] = [value] * GRID_SIZE
+            if short:
+                grid[index][rng.randrange(GRID_SIZE)] -= 1
+        else:
+            for row in grid:
+                row[index] = value
+            if short:
+                grid[rng.randrange(GRID_SIZE)][index] -= 1
+    return grid
+
+
+@pytest.fixture
+def grids():
+    rng = random.Random(0)
+    return [random_grid(rng) for _ in range(300)]
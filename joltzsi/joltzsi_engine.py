@@ -0,0 +1,414 @@
+import random
+from collections import namedtuple
+
+import packed
+from packed import GRID_SIZE
+
+# Headless Joltzsi rules with no pygame dependency. main.py drives a
+# JoltzsiState for the interactive game; rollouts and tools use it directly.
+
+time_limits = {
+    1: 30000, 2: 28000, 3: 26000, 4: 24000, 5: 22000, 6: 20000, 7: 18000,
+    8: 16000, 9: 14000, 10: 12000, 11: 10000, 12: 9000, 13: 8000, 14: 7000,
+    15: 6000, 16: 5000, 17: 4500, 18: 4000, 19: 3500, 20: 3000, 21: 2800,
+    22: 2600, 23: 2400, 24: 2200, 25: 2000, 26: 1800, 27: 1600, 28: 1400,
+}
+
+default_time_limit = 1200  # Level 29 and up
+
+# Tetromino shapes
+TETROMINOS = [
+    [(0, 0), (1, 0), (0, 1), (1, 1)],  # O
+    [(0, 0), (1, 0), (2, 0), (3, 0)],  # I
+    [(0, 0), (0, 1), (1, 1), (2, 1)],  # J
+    [(2, 0), (0, 1), (1, 1), (2, 1)],  # L
+    [(1, 0), (2, 0), (0, 1), (1, 1)],  # S
+    [(0, 0), (1, 0), (1, 1), (2, 1)],  # Z
+    [(1, 0), (0, 1), (1, 1), (2, 1)]   # T
+]
+
+LINE_PIECE = [(0, 0), (1, 0), (2, 0), (3, 0)]
+
+# Tile colors by value; values above 4 only appear on the game over board
+COLORS = {
+    0: (30, 30, 30),       # Black
+    1: (173, 216, 230),    # White-Blue
+    2: (255, 0, 0),        # Red
+    3: (0, 255, 255),      # Cyan
+    4: (0, 255, 0)         # Green
+}
+
+OVERFLOW_COLOR = (255, 255, 255)
+HIGHLIGHT_COLOR = (255, 255, 0)
+
+# Inputs understood by JoltzsiController
+LEFT, RIGHT, UP, DOWN, ROTATE, PLACE = range(6)
+
+score_table = {
+    1: 40,
+    2: 100,
+    3: 300,
+    4: 1200
+}
+
+# Returned by JoltzsiState.place when rows or columns cleared; grid is the
+# board before the cleared lines were emptied
+LineClear = namedtuple('LineClear', [
+    'rows', 'cols', 'rows_values', 'cols_values', 'points', 'grid'
+])
+
+
+def create_grid():
+    return [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+
+
+def random_piece(rng=random):
+    return [block[:] for block in rng.choice(TETROMINOS)]
+
+
+def rotate_piece(piece):
+    return [(-dy, dx) for dx, dy in piece]
+
+
+def can_place(piece, grid_x, grid_y):
+    for dx, dy in piece:
+        x = grid_x + dx
+        y = grid_y + dy
+        if x < 0 or x >= GRID_SIZE or y < 0 or y >= GRID_SIZE:
+            return False
+    return True
+
+
+def scan_placement(piece, grid_x, grid_y):
+    # Packed cell mask of the piece at (grid_x, grid_y), 0 when a cell is off
+    # the board
+    if not can_place(piece, grid_x, grid_y):
+        return 0
+    return packed.cells_mask((grid_x + dx, grid_y + dy) for dx, dy in piece)
+
+
+# Placement table of every orientation rotate_piece reaches from TETROMINOS:
+# PLACEMENTS[tuple(piece)][(grid_y + ANCHOR_OFFSET) * ANCHOR_SPAN + grid_x +
+# ANCHOR_OFFSET] is scan_placement(piece, grid_x, grid_y). Piece cells lie
+# within 3 of the anchor, so no anchor outside the table can be legal.
+# can_place itself stays a bounds check: for a single piece it costs no more
+# than hashing the piece to find its table.
+ANCHOR_OFFSET = 3
+ANCHOR_SPAN = GRID_SIZE + 2 * ANCHOR_OFFSET
+
+
+def build_placements():
+    placements = {}
+    for piece in TETROMINOS:
+        for _ in range(4):
+            # Legal anchors shift one mask, that of the piece pushed into
+            # the top left corner
+            left = min(dx for dx, dy in piece)
+            top = min(dy for dx, dy in piece)
+            width = max(dx for dx, dy in piece) - left + 1
+            height = max(dy for dx, dy in piece) - top + 1
+            corner = packed.cells_mask((dx - left, dy - top) for dx, dy in piece)
+            table = [0] * (ANCHOR_SPAN * ANCHOR_SPAN)
+            for y in range(GRID_SIZE - height + 1):
+                for x in range(GRID_SIZE - width + 1):
+                    anchor = (y - top + ANCHOR_OFFSET) * ANCHOR_SPAN + x - left + ANCHOR_OFFSET
+                    table[anchor] = corner << packed.shift(x, y)
+            placements[tuple(piece)] = table
+            piece = rotate_piece(piece)
+    return placements
+
+
+PLACEMENTS = build_placements()
+
+
+def placement_mask(piece, grid_x, grid_y):
+    table = PLACEMENTS.get(tuple(piece))
+    if table is None:
+        return scan_placement(piece, grid_x, grid_y)
+    x = grid_x + ANCHOR_OFFSET
+    y = grid_y + ANCHOR_OFFSET
+    if 0 <= x < ANCHOR_SPAN and 0 <= y < ANCHOR_SPAN:
+        return table[y * ANCHOR_SPAN + x]
+    return 0
+
+
+def get_time_limit(level):
+    return time_limits.get(level, default_time_limit)
+
+
+def time_bonus(elapsed, time_limit):
+    # Up to 20 points for placing before the timer runs down
+    remaining_ms = max(time_limit - elapsed, 0)
+    return int((remaining_ms / (elapsed + remaining_ms)) * 20)
+
+
+def add_piece(grid, piece, grid_x, grid_y):
+    # Stack the piece onto the grid; False as soon as a cell overflows past 4
+    for dx, dy in piece:
+        x = grid_x + dx
+        y = grid_y + dy
+        grid[y][x] += 1
+        if grid[y][x] > 4:
+            return False  # Game over
+    return True
+
+
+def find_lines(grid):
+    rows_to_clear = []
+    cols_to_clear = []
+    rows_values = []
+    cols_values = []
+
+    # Check rows
+    for y in range(GRID_SIZE):
+        value = grid[y][0]
+        if value in [1, 2, 3, 4] and all(grid[y][x] == value for x in range(GRID_SIZE)):
+            rows_to_clear.append(y)
+            rows_values.append(value)
+
+    # Check columns
+    for x in range(GRID_SIZE):
+        value = grid[0][x]
+        if value in [1, 2, 3, 4] and all(grid[y][x] == value for y in range(GRID_SIZE)):
+            cols_to_clear.append(x)
+            cols_values.append(value)
+
+    return rows_to_clear, cols_to_clear, rows_values, cols_values
+
+
+def multiplier(value):
+    if 0.99 < value <= 1.0:
+        return 1
+    elif 1.0 < value <= 2.0:
+        return 2
+    elif 2.0 < value <= 3.0:
+        return 4
+    elif 3.0 < value:
+        return 8
+    else:
+        return 1
+
+
+def line_clear_score(rows_values, cols_values, level):
+    rows_cleared = len(rows_values)
+    cols_cleared = len(cols_values)
+
+    # Calculate base scores for rows
+    row_base = score_table.get(rows_cleared, 0)
+    if rows_values:
+        avg_row_value = sum(rows_values) / len(rows_values)
+    else:
+        avg_row_value = 0
+
+    row_multiplier = multiplier(avg_row_value)
+    row_score = row_base * row_multiplier
+
+    # Calculate base scores for columns
+    col_base = score_table.get(cols_cleared, 0)
+    if cols_values:
+        avg_col_value = sum(cols_values) / len(cols_values)
+    else:
+        avg_col_value = 0
+
+    col_multiplier = multiplier(avg_col_value)
+    col_score = col_base * col_multiplier
+
+    # Determine if final multiplier is needed
+    if rows_cleared > 0 and cols_cleared > 0:
+        final_multiplier = round((rows_cleared + cols_cleared) / 2, 1)
+    else:
+        final_multiplier = 1
+    final_multiplier *= (cols_cleared * avg_col_value + rows_cleared * avg_row_value)
+
+    # Final score calculation
+    total_score = (row_score + col_score) * final_multiplier
+    total_score /= 2
+    total_score *= level
+    return total_score
+
+
+def clear_lines(grid, rows_to_clear, cols_to_clear):
+    for y in rows_to_clear:
+        for x in range(GRID_SIZE):
+            grid[y][x] = 0
+    for x in cols_to_clear:
+        for y in range(GRID_SIZE):
+            grid[y][x] = 0
+
+
+def start_position(piece):
+    if piece == LINE_PIECE:
+        return 0, 2
+    return 2, 2
+
+
+_legal_moves_cache = {}
+
+
+def legal_moves(piece):
+    # Every distinct (piece, x, y) reachable with rotate_piece and the arrow
+    # keys; orientations that cover the same cells are listed once. The list
+    # is cached per piece, so callers must not modify it.
+    key = tuple(piece)
+    moves = _legal_moves_cache.get(key)
+    if moves is not None:
+        return moves
+    moves = []
+    seen = set()
+    for _ in range(4):
+        for y in range(-3, GRID_SIZE + 3):
+            for x in range(-3, GRID_SIZE + 3):
+                if can_place(piece, x, y):
+                    cells = frozenset((x + dx, y + dy) for dx, dy in piece)
+                    if cells not in seen:
+                        seen.add(cells)
+                        moves.append((piece, x, y))
+        piece = rotate_piece(piece)
+    _legal_moves_cache[key] = moves
+    return moves
+
+
+class JoltzsiState:
+    def __init__(self, rng=random):
+        self.rng = rng
+        self.grid = create_grid()
+        self.board = 0  # grid packed as in packed.py, kept in step with it
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+        self.current_piece = random_piece(rng)
+        self.next_piece = random_piece(rng)
+        # Start in center
+        self.piece_x, self.piece_y = 2, 2
+        self.game_over = False
+
+    def time_limit(self):
+        return get_time_limit(self.level)
+
+    def move(self, dx, dy):
+        if can_place(self.current_piece, self.piece_x + dx, self.piece_y + dy):
+            self.piece_x += dx
+            self.piece_y += dy
+            return True
+        return False
+
+    def rotate(self):
+        rotated = rotate_piece(self.current_piece)
+        if can_place(rotated, self.piece_x, self.piece_y):
+            self.current_piece = rotated
+            return True
+        return False
+
+    def check_lines(self):
+        grid = self.grid
+        rows, cols, rows_values, cols_values = packed.find_lines(self.board)
+        if not rows and not cols:
+            return None
+
+        points = line_clear_score(rows_values, cols_values, self.level)
+        self.score += points
+        before = [row[:] for row in grid]
+        clear_lines(grid, rows, cols)
+        self.board = packed.clear_lines(self.board, rows, cols)
+
+        # Update cleared lines count and level
+        self.lines_cleared += len(rows) + len(cols)
+        if self.lines_cleared // 10 + 1 > self.level:
+            self.level += 1
+        return LineClear(rows, cols, rows_values, cols_values, points, before)
+
+    def place(self, elapsed=0, timed_out=False):
+        # Place the current piece where it is. elapsed is the time in ms the
+        # player took, which sets the time bonus. Returns a LineClear or None.
+        mask = placement_mask(self.current_piece, self.piece_x, self.piece_y)
+        if not mask:
+            self.game_over = True
+            return None
+
+        self.score += time_bonus(elapsed, self.time_limit())
+        result = None
+        if add_piece(self.grid, self.current_piece, self.piece_x, self.piece_y):
+            self.board += mask
+            self.score += 1  # existing +1 point for placing a piece
+            result = self.check_lines()
+            self.current_piece = self.next_piece
+            self.next_piece = random_piece(self.rng)
+        else:
+            self.game_over = True
+
+        self.pieces_placed += 1
+        if timed_out:
+            # A forced placement also re-derives the level from pieces placed
+            self.level = self.pieces_placed // 10 + 1
+        if self.level >= 256:
+            self.game_over = True
+        self.piece_x, self.piece_y = start_position(self.current_piece)
+        return result
+
+    def step(self, piece, grid_x, grid_y, elapsed=0):
+        # Headless move: put the given orientation of the current piece at
+        # (grid_x, grid_y) and place it; returns the score gained
+        if self.game_over:
+            return 0
+        score_before = self.score
+        self.current_piece = piece
+        self.piece_x, self.piece_y = grid_x, grid_y
+        self.place(elapsed)
+        return self.score - score_before
+
+
+class JoltzsiController:
+    # The timer rules of main(): the time limit for the level, the forced
+    # placement when it runs out and the bonus from the time taken. Time is
+    # read from clock (see clock.py) once per frame, so live play and
+    # replays make the same placements with the same bonuses.
+    def __init__(self, state, clock):
+        self.state = state
+        self.clock = clock
+        self.frame_time = clock.now()
+        self.piece_start = self.frame_time  # Start timer for first piece
+
+    @property
+    def elapsed(self):
+        # ms spent on the current piece
+        return self.clock.now() - self.piece_start
+
+    def place(self, timed_out=False):
+        result = self.state.place(self.frame_time - self.piece_start, timed_out)
+        # Reset timer for next piece
+        self.piece_start = self.frame_time
+        return result
+
+    def handle_input(self, action):
+        state = self.state
+        if state.game_over:
+            return None
+        if action == LEFT:
+            state.move(-1, 0)
+        elif action == RIGHT:
+            state.move(1, 0)
+        elif action == UP:
+            state.move(0, -1)
+        elif action == DOWN:
+            state.move(0, 1)
+        elif action == ROTATE:
+            state.rotate()
+        elif action == PLACE:
+            if can_place(state.current_piece, state.piece_x, state.piece_y):
+                return self.place()
+        return None
+
+    def frame(self, inputs=()):
+        # Returns the LineClear of every placement that cleared lines this frame
+        state = self.state
+        results = []
+        self.frame_time = self.clock.now()
+
+        # Force place piece if time runs out
+        if not state.game_over and self.frame_time - self.piece_start >= state.time_limit():
+            results.append(self.place(timed_out=True))
+
+        for action in inputs:
+            results.append(self.handle_input(action))
+        return [result for result in results if result]
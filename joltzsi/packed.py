@@ -0,0 +1,182 @@
+# Joltzsi boards packed into one int, 3 bits per cell: cell (x, y) holds its
+# value at bit 3 * (y * GRID_SIZE + x), so the 5x5 board takes 75 bits and a
+# row is 15 contiguous bits. Ints hash and compare cheaply and cost a few
+# dozen bytes each in sets and dicts, against several hundred for a list of
+# lists.
+#
+# Values stay within 0-4 on a live board, so bit 2 of a cell is set exactly
+# when it holds 4. Adding a piece is one integer add of its cell mask and it
+# overflows when one of its cells already held 4.
+#
+# joltzsi_engine builds on this module, so the board size is defined here.
+
+GRID_SIZE = 5
+
+CELL_BITS = 3
+CELL_MASK = (1 << CELL_BITS) - 1
+CELLS = GRID_SIZE * GRID_SIZE
+ROW_BITS = CELL_BITS * GRID_SIZE
+ROW_MASK = (1 << ROW_BITS) - 1
+BOARD_BITS = CELL_BITS * CELLS
+
+# A 1 in every cell, and the bit that is set in cells holding 4
+ONES = sum(1 << CELL_BITS * i for i in range(CELLS))
+FOURS = ONES << 2
+
+
+def shift(x, y):
+    return CELL_BITS * (y * GRID_SIZE + x)
+
+
+# ROW_ONES[y] and COLUMN_ONES[x] have a 1 in every cell of that line;
+# value * ROW_ONES[y] is the row filled with value
+ROW_ONES = [sum(1 << shift(x, y) for x in range(GRID_SIZE)) for y in range(GRID_SIZE)]
+COLUMN_ONES = [sum(1 << shift(x, y) for y in range(GRID_SIZE)) for x in range(GRID_SIZE)]
+ROW_MASKS = [ones * CELL_MASK for ones in ROW_ONES]
+COLUMN_MASKS = [ones * CELL_MASK for ones in COLUMN_ONES]
+
+# ROW_LINES[value][y] and COLUMN_LINES[value][x] are the line filled with
+# value; index 0 is never a line
+ROW_LINES = [[value * ones if value else -1 for ones in ROW_ONES] for value in range(8)]
+COLUMN_LINES = [[value * ones if value else -1 for ones in COLUMN_ONES] for value in range(8)]
+
+
+def encode(grid):
+    key = 0
+    for y in range(GRID_SIZE - 1, -1, -1):
+        row = grid[y]
+        for x in range(GRID_SIZE - 1, -1, -1):
+            key = key << CELL_BITS | row[x]
+    return key
+
+
+def decode(key):
+    grid = []
+    for _ in range(GRID_SIZE):
+        row = []
+        for _ in range(GRID_SIZE):
+            row.append(key & CELL_MASK)
+            key >>= CELL_BITS
+        grid.append(row)
+    return grid
+
+
+def get_cell(key, x, y):
+    return key >> shift(x, y) & CELL_MASK
+
+
+def cells_mask(cells):
+    # A 1 in each (x, y) of cells, the amount a placement adds to the board
+    return sum(1 << shift(x, y) for x, y in cells)
+
+
+def add_cells(key, mask):
+    # The board with a placement stacked on, or None when a cell passes 4
+    if key & FOURS & mask << 2:
+        return None
+    return key + mask
+
+
+def find_lines(key):
+    # Same result as joltzsi_engine.find_lines on the decoded board
+    rows_to_clear = []
+    cols_to_clear = []
+    rows_values = []
+    cols_values = []
+
+    # A line is full when it equals its first cell's value repeated
+    for y in range(GRID_SIZE):
+        value = key >> ROW_BITS * y & CELL_MASK
+        if key & ROW_MASKS[y] == ROW_LINES[value][y]:
+            rows_to_clear.append(y)
+            rows_values.append(value)
+
+    for x in range(GRID_SIZE):
+        value = key >> CELL_BITS * x & CELL_MASK
+        if key & COLUMN_MASKS[x] == COLUMN_LINES[value][x]:
+            cols_to_clear.append(x)
+            cols_values.append(value)
+
+    return rows_to_clear, cols_to_clear, rows_values, cols_values
+
+
+def clear_lines(key, rows_to_clear, cols_to_clear):
+    mask = 0
+    for y in rows_to_clear:
+        mask |= ROW_MASKS[y]
+    for x in cols_to_clear:
+        mask |= COLUMN_MASKS[x]
+    return key & ~mask
+
+
+# The eight symmetries of the square as maps of (x, y). The rules treat rows
+# and columns alike and the piece set is closed under rotation and mirroring,
+# so symmetric boards are worth the same.
+_last = GRID_SIZE - 1
+SYMMETRIES = [
+    lambda x, y: (x, y),
+    lambda x, y: (_last - y, x),
+    lambda x, y: (_last - x, _last - y),
+    lambda x, y: (y, _last - x),
+    lambda x, y: (_last - x, y),
+    lambda x, y: (x, _last - y),
+    lambda x, y: (y, x),
+    lambda x, y: (_last - y, _last - x),
+]
+
+# Boards are transformed a few cells at a time: the key is cut into CHUNK_BITS
+# wide chunks and each chunk's transformed bits are looked up and ORed.
+CHUNK_CELLS = 3
+CHUNK_BITS = CELL_BITS * CHUNK_CELLS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+CHUNK_COUNT = -(-CELLS // CHUNK_CELLS)
+
+
+def _build_tables(symmetry):
+    tables = []
+    for chunk in range(CHUNK_COUNT):
+        # Extended one cell at a time: entry (value << CELL_BITS * i) | low
+        # is the moved value ORed onto entry low
+        table = [0]
+        for cell in range(chunk * CHUNK_CELLS, (chunk + 1) * CHUNK_CELLS):
+            if cell < CELLS:
+                offset = shift(*symmetry(cell % GRID_SIZE, cell // GRID_SIZE))
+                moved = [value << offset for value in range(CELL_MASK + 1)]
+            else:
+                moved = [0] * (CELL_MASK + 1)
+            table = [high | low for high in moved for low in table]
+        tables.append(table)
+    return tables
+
+
+# TRANSFORM_TABLES[symmetry][chunk], built on first use as the game itself
+# never transforms boards
+TRANSFORM_TABLES = []
+
+
+def transform(key, symmetry):
+    # The board moved by SYMMETRIES[symmetry]
+    if not TRANSFORM_TABLES:
+        TRANSFORM_TABLES.extend(_build_tables(move) for move in SYMMETRIES)
+    out = 0
+    for table in TRANSFORM_TABLES[symmetry]:
+        out |= table[key & CHUNK_MASK]
+        key >>= CHUNK_BITS
+    return out
+
+
+def transform_cells(cells, symmetry):
+    move = SYMMETRIES[symmetry]
+    return [move(x, y) for x, y in cells]
+
+
+def canonical(key):
+    # (smallest key among the eight symmetric boards, the symmetry giving it)
+    best = key
+    best_symmetry = 0
+    for symmetry in range(1, len(SYMMETRIES)):
+        other = transform(key, symmetry)
+        if other < best:
+            best = other
+            best_symmetry = symmetry
+    return best, best_symmetry
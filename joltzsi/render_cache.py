@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+import pygame
+
+from joltzsi_engine import COLORS, OVERFLOW_COLOR
+
+# Prerendered surfaces for the Joltzsi front end. A frame used to render the
+# number of every filled cell and each line of text again at 60 FPS; tiles
+# are now drawn once per value and text once per distinct string, so a frame
+# is mostly blits.
+
+TEXT_CACHE_SIZE = 256  # the timer alone shows up to a few hundred strings
+NUMBER_COLOR = (0, 0, 0)
+
+
+def text_renderer(font, size=TEXT_CACHE_SIZE):
+    # font.render(text, True, color), memoized on (text, color) with LRU eviction
+    @lru_cache(maxsize=size)
+    def render(text, color):
+        return font.render(text, True, color)
+    return render
+
+
+def build_tiles(screen, font, tile_size):
+    # {value: tile} for values 0-4, colour plus centred number as draw_grid
+    # painted them, and the plain tile shown for values above 4
+    tiles = {}
+    for value, color in COLORS.items():
+        tile = pygame.Surface((tile_size, tile_size), 0, screen)
+        tile.fill(color)
+        if value:
+            text = font.render(str(value), True, NUMBER_COLOR)
+            tile.blit(text, text.get_rect(center=tile.get_rect().center))
+        tiles[value] = tile
+    overflow = pygame.Surface((tile_size, tile_size), 0, screen)
+    overflow.fill(OVERFLOW_COLOR)
+    return tiles, overflow
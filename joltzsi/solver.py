@@ -0,0 +1,219 @@
+import argparse
+import os
+import struct
+import time
+
+import numpy as np
+
+import packed
+from batch_scoring import MOVE_X, PIECE_COUNT, evaluate_moves
+from joltzsi_engine import line_clear_score, legal_moves, placement_mask
+
+# Exact expectimax values for the opening of a Joltzsi game. Play is unbounded
+# and there are 5 ** 25 boards, so the solver covers the first PIECES
+# placements: layer k holds every board reachable after k pieces, up to
+# symmetry, with the expected points of the remaining PIECES - k pieces
+# under best play. Each piece is drawn uniformly from TETROMINOS and scores
+# check_lines' points at level 1 plus the point for placing it. The time
+# bonus and the next piece preview are ignored, and an overflowing placement
+# ends the game with nothing more to gain.
+#
+# Layers are built forwards from the empty board and valued backwards with
+# batch_scoring, then written to one file of sorted keys and values. ValueTable
+# maps it read-only, so any number of processes share one copy in the page
+# cache and opening it costs nothing.
+#
+#   python joltzsi/solver.py --pieces 4
+
+PIECES = 4
+CHUNK = 1024  # boards evaluated per batch_scoring call
+VALUE_FILE = 'solver_values.bin'
+
+MAGIC = b'JZSOLV01'
+HEADER = struct.Struct('<I')  # layer count, followed by one '<Q' size per layer
+
+# Packed boards (see packed.py) need 75 bits, so keys are split after the
+# first 21 cells; ordering (high, low) orders the packed ints
+KEY_DTYPE = np.dtype([('high', '<u8'), ('low', '<u8')])
+LOW_CELLS = 63 // packed.CELL_BITS
+LOW_BITS = LOW_CELLS * packed.CELL_BITS
+LOW_SHIFTS = (np.arange(LOW_CELLS) * packed.CELL_BITS).astype(np.uint64)
+HIGH_SHIFTS = (np.arange(packed.CELLS - LOW_CELLS) * packed.CELL_BITS).astype(np.uint64)
+
+MOVE_COUNT = MOVE_X.shape[1]
+
+
+def pack_boards(boards):
+    cells = boards.reshape(len(boards), packed.CELLS).astype(np.uint64)
+    keys = np.empty(len(boards), dtype=KEY_DTYPE)
+    keys['high'] = (cells[:, LOW_CELLS:] << HIGH_SHIFTS).sum(axis=1)
+    keys['low'] = (cells[:, :LOW_CELLS] << LOW_SHIFTS).sum(axis=1)
+    return keys
+
+
+def canonical_keys(boards):
+    # Smallest key among the eight symmetric boards, as packed.canonical
+    keys = pack_boards(boards)
+    for board_view in (boards, boards.transpose(0, 2, 1)):
+        for turns in range(4):
+            if board_view is boards and turns == 0:
+                continue
+            other = pack_boards(np.rot90(board_view, turns, axes=(1, 2)))
+            smaller = (other['high'] < keys['high']) | (
+                (other['high'] == keys['high']) & (other['low'] < keys['low']))
+            keys[smaller] = other[smaller]
+    return keys
+
+
+def split_key(key):
+    return np.array((key >> LOW_BITS, key & ((1 << LOW_BITS) - 1)), dtype=KEY_DTYPE)
+
+
+def expand(boards):
+    # Every move of every piece on each board, at level 1
+    count = len(boards) * PIECE_COUNT
+    result, valid = evaluate_moves(
+        np.repeat(boards, PIECE_COUNT, axis=0),
+        np.tile(np.arange(PIECE_COUNT), len(boards)),
+        np.ones(count, dtype=np.int64),
+    )
+    return result, valid.ravel()
+
+
+def next_layer(boards, chunk=CHUNK):
+    # (sorted canonical keys, one board per key) of every board one piece on
+    keys = []
+    representatives = []
+    for start in range(0, len(boards), chunk):
+        result, valid = expand(boards[start:start + chunk])
+        successors = result.boards[valid & ~result.overflow]
+        chunk_keys, index = np.unique(canonical_keys(successors), return_index=True)
+        keys.append(chunk_keys)
+        representatives.append(successors[index].astype(np.int8))
+    keys, index = np.unique(np.concatenate(keys), return_index=True)
+    return keys, np.concatenate(representatives)[index]
+
+
+def layer_values(boards, next_keys=None, next_values=None, chunk=CHUNK):
+    # Expected points of each board with one piece more to place than the
+    # layer of next_keys has, which is None after the last piece
+    values = np.empty(len(boards))
+    for start in range(0, len(boards), chunk):
+        result, valid = expand(boards[start:start + chunk])
+        gains = result.points + 1
+        if next_keys is not None:
+            placed = valid & ~result.overflow
+            index = np.searchsorted(next_keys, canonical_keys(result.boards[placed]))
+            gains[placed] += next_values[index]
+        gains[result.overflow] = 0
+        gains[~valid] = -np.inf
+        best = gains.reshape(-1, MOVE_COUNT).max(axis=1)
+        values[start:start + chunk] = best.reshape(-1, PIECE_COUNT).mean(axis=1)
+    return values
+
+
+def solve(pieces=PIECES, chunk=CHUNK, log=print):
+    # [(keys, values)] for layers 0 to pieces - 1
+    empty = np.zeros((1, packed.GRID_SIZE, packed.GRID_SIZE), dtype=np.int8)
+    layers = [(canonical_keys(empty), empty)]
+    for k in range(1, pieces):
+        start = time.perf_counter()
+        layers.append(next_layer(layers[-1][1], chunk))
+        log(f"layer {k}: {len(layers[-1][0]):,} boards in {time.perf_counter() - start:.1f}s")
+
+    solved = [None] * pieces
+    next_keys = next_values = None
+    for k in range(pieces - 1, -1, -1):
+        start = time.perf_counter()
+        keys, boards = layers[k]
+        values = layer_values(boards, next_keys, next_values, chunk)
+        solved[k] = (keys, values)
+        next_keys, next_values = keys, values
+        log(f"layer {k}: valued in {time.perf_counter() - start:.1f}s")
+    return solved
+
+
+def save(path, layers):
+    header = MAGIC + HEADER.pack(len(layers))
+    header += b''.join(struct.pack('<Q', len(keys)) for keys, _ in layers)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(header)
+        for keys, values in layers:
+            file.write(keys.astype(KEY_DTYPE).tobytes())
+            file.write(values.astype('<f8').tobytes())
+    os.replace(temp_path, path)
+
+
+class ValueTable:
+    # Read-only view of a saved solution; nothing is read until it is looked up
+    def __init__(self, path=VALUE_FILE):
+        with open(path, 'rb') as file:
+            head = file.read(len(MAGIC) + HEADER.size)
+            if not head.startswith(MAGIC):
+                raise ValueError(f"{path} is not a Joltzsi value table")
+            (layer_count,) = HEADER.unpack_from(head, len(MAGIC))
+            sizes = struct.unpack(f'<{layer_count}Q', file.read(8 * layer_count))
+
+        self.pieces = layer_count
+        self.layers = []
+        offset = len(head) + 8 * layer_count
+        for size in sizes:
+            keys = np.memmap(path, dtype=KEY_DTYPE, mode='r', offset=offset, shape=(size,))
+            offset += size * KEY_DTYPE.itemsize
+            values = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=(size,))
+            offset += size * 8
+            self.layers.append((keys, values))
+
+    def value(self, board, pieces_placed):
+        # Expected points still to come on packed board after pieces_placed
+        # pieces, or None when the table does not reach it
+        if pieces_placed >= self.pieces:
+            return None if pieces_placed > self.pieces else 0.0
+        keys, values = self.layers[pieces_placed]
+        key = split_key(packed.canonical(board)[0])
+        index = np.searchsorted(keys, key)
+        if index < len(keys) and keys[index] == key:
+            return float(values[index])
+        return None
+
+    def best_move(self, state):
+        # The (piece, x, y) of legal_moves with the highest expected points
+        # for a JoltzsiState still inside the table, otherwise None
+        placed = state.pieces_placed
+        if placed >= self.pieces or self.value(state.board, placed) is None:
+            return None
+        best = None
+        best_gain = -1.0
+        for move in legal_moves(state.current_piece):
+            board = packed.add_cells(state.board, placement_mask(*move))
+            gain = 0.0
+            if board is not None:
+                rows, cols, rows_values, cols_values = packed.find_lines(board)
+                if rows or cols:
+                    gain += line_clear_score(rows_values, cols_values, 1)
+                    board = packed.clear_lines(board, rows, cols)
+                gain += 1 + self.value(board, placed + 1)
+            if gain > best_gain:
+                best, best_gain = move, gain
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the opening of Joltzsi exactly")
+    parser.add_argument('--pieces', type=int, default=PIECES,
+                        help="placements covered from the empty board")
+    parser.add_argument('--output', default=VALUE_FILE)
+    parser.add_argument('--chunk', type=int, default=CHUNK)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    layers = solve(args.pieces, args.chunk)
+    save(args.output, layers)
+    print(f"expected points over {args.pieces} pieces: {layers[0][1][0]:.3f}")
+    print(f"wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import random
+
+import numpy as np
+
+from batch_scoring import MOVE_X, PIECE_COUNT, evaluate_moves
+from joltzsi_engine import (
+    TETROMINOS, add_piece, clear_lines, find_lines, legal_moves, line_clear_score
+)
+
+# batch_scoring against JoltzsiState's scalar path: boards, overflow flags
+# and points must be equal, the points to the last bit. The grids fixture
+# is in conftest.py.
+
+
+def test_evaluate_moves_matches_engine(grids):
+    rng = random.Random(1)
+    pieces = [rng.randrange(PIECE_COUNT) for _ in grids]
+    levels = [rng.randrange(1, 30) for _ in grids]
+
+    result, valid = evaluate_moves(np.array(grids), np.array(pieces), np.array(levels))
+    move_count = MOVE_X.shape[1]
+    cleared = overflowed = 0
+    for b, (grid, piece, level) in enumerate(zip(grids, pieces, levels)):
+        moves = legal_moves(TETROMINOS[piece])
+        assert valid[b].sum() == len(moves)
+        for m, move in enumerate(moves):
+            index = b * move_count + m
+            after = [row[:] for row in grid]
+            points = 0.0
+            if add_piece(after, *move):
+                rows, cols, rows_values, cols_values = find_lines(after)
+                if rows or cols:
+                    points = line_clear_score(rows_values, cols_values, level)
+                    clear_lines(after, rows, cols)
+                    cleared += 1
+                assert not result.overflow[index]
+            else:
+                assert result.overflow[index]
+                overflowed += 1
+            assert result.points[index] == points
+            assert result.boards[index].tolist() == after
+    assert cleared and overflowed
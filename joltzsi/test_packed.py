@@ -0,0 +1,58 @@
+import packed
+from joltzsi_engine import (
+    GRID_SIZE, TETROMINOS, add_piece, clear_lines, find_lines, legal_moves, placement_mask
+)
+
+# packed.py against the list grid it encodes: every operation must give the
+# board and lines the engine's list functions give. The grids fixture is
+# in conftest.py.
+
+
+def test_encode_round_trip(grids):
+    for grid in grids:
+        key = packed.encode(grid)
+        assert packed.decode(key) == grid
+        for y in range(GRID_SIZE):
+            for x in range(GRID_SIZE):
+                assert packed.get_cell(key, x, y) == grid[y][x]
+
+
+def test_find_and_clear_lines_match_grid(grids):
+    for grid in grids:
+        key = packed.encode(grid)
+        lines = find_lines(grid)
+        assert packed.find_lines(key) == lines
+        rows, cols = lines[0], lines[1]
+        clear_lines(grid, rows, cols)
+        assert packed.clear_lines(key, rows, cols) == packed.encode(grid)
+
+
+def test_add_cells_matches_add_piece(grids):
+    placed = overflowed = 0
+    for grid in grids[:100]:
+        key = packed.encode(grid)
+        for piece in TETROMINOS:
+            for move in legal_moves(piece):
+                after = [row[:] for row in grid]
+                board = packed.add_cells(key, placement_mask(*move))
+                if add_piece(after, *move):
+                    assert board == packed.encode(after)
+                    placed += 1
+                else:
+                    assert board is None
+                    overflowed += 1
+    assert placed and overflowed
+
+
+def test_symmetries(grids):
+    for grid in grids[:100]:
+        key = packed.encode(grid)
+        smallest, symmetry = packed.canonical(key)
+        assert packed.transform(key, symmetry) == smallest
+        for index, move in enumerate(packed.SYMMETRIES):
+            moved = packed.decode(packed.transform(key, index))
+            for y in range(GRID_SIZE):
+                for x in range(GRID_SIZE):
+                    new_x, new_y = move(x, y)
+                    assert moved[new_y][new_x] == grid[y][x]
+            assert packed.canonical(packed.encode(moved))[0] == smallest
@@ -0,0 +1,112 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from bitboard import FULL_ROW, PIECE_MASKS, scan_tops, surface_features
+from tetris_engine import COLUMNS, ROWS, PLACEMENTS, ROTATION_INFO, line_clear_points
+
+# Every final resting position of a piece in one call. Boards are handled as
+# bitboard rows (one int per row, bit x = column x) and each result holds the
+# board after the lock and line clear as an immutable tuple of those rows.
+# Search revisits the same boards constantly, so results are memoized in an
+# LRU keyed by the whole board packed into a single int.
+#
+# Each result also carries the BoardFeatures of its board. Column tops are
+# found once per call and moved by the cells of each placement; only a
+# placement that clears lines has its board scanned again.
+
+CACHE_SIZE = 8192
+
+Afterstate = namedtuple('Afterstate', ['rotation', 'x', 'rows', 'lines_cleared', 'score_delta', 'features'])
+
+
+def rows_from_grid(grid):
+    return tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in grid)
+
+
+def grid_from_rows(rows, value=1):
+    return [[value if mask >> x & 1 else 0 for x in range(COLUMNS)] for mask in rows]
+
+
+def pack_rows(rows):
+    key = 0
+    for mask in rows:
+        key = key << COLUMNS | mask
+    return key
+
+
+def unpack_rows(key):
+    rows = [0] * ROWS
+    for y in range(ROWS - 1, -1, -1):
+        rows[y] = key & FULL_ROW
+        key >>= COLUMNS
+    return rows
+
+
+def drop_piece(rows, type_id, rotation, x):
+    # Row the piece comes to rest on when dropped straight down from row 0,
+    # like gravity moves it; None when it does not fit at row 0
+    masks = [mask << x for mask in PIECE_MASKS[type_id][rotation]]
+    last_y = ROWS - len(masks)
+    y = -1
+    while y < last_y:
+        for i, mask in enumerate(masks):
+            if rows[y + 1 + i] & mask:
+                break
+        else:
+            y += 1
+            continue
+        break
+    return y if y >= 0 else None
+
+
+def place_rows(rows, type_id, rotation, x, y):
+    # Lock the piece and remove full rows; returns (rows, lines cleared)
+    placed = list(rows)
+    for i, mask in enumerate(PIECE_MASKS[type_id][rotation]):
+        placed[y + i] |= mask << x
+    kept = [mask for mask in placed if mask != FULL_ROW]
+    cleared = ROWS - len(kept)
+    if cleared:
+        kept = [0] * cleared + kept
+    return tuple(kept), cleared
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _afterstates(board_key, type_id, level):
+    rows = unpack_rows(board_key)
+    tops = scan_tops(rows)
+    filled = sum(mask.bit_count() for mask in rows) + 4
+    results = []
+    for rotation, x in PLACEMENTS[type_id]:
+        y = drop_piece(rows, type_id, rotation, x)
+        if y is None:
+            continue
+        after, cleared = place_rows(rows, type_id, rotation, x, y)
+        if cleared:
+            after_tops = scan_tops(after)
+        else:
+            info = ROTATION_INFO[type_id][rotation]
+            after_tops = tops[:]
+            for column, top in zip(info.columns, info.top):
+                if y + top < after_tops[x + column]:
+                    after_tops[x + column] = y + top
+        features = surface_features(after_tops, filled - cleared * COLUMNS)
+        results.append(Afterstate(rotation, x, after, cleared, line_clear_points(cleared, level), features))
+    return tuple(results)
+
+
+def afterstates_from_rows(rows, type_id, level=1):
+    return _afterstates(pack_rows(rows), type_id, level)
+
+
+def afterstates(grid, type_id, level=1):
+    # grid is the usual list of rows from create_grid / TetrisState.grid
+    return _afterstates(pack_rows(rows_from_grid(grid)), type_id, level)
+
+
+def cache_info():
+    return _afterstates.cache_info()
+
+
+def clear_cache():
+    _afterstates.cache_clear()
@@ -0,0 +1,132 @@
+import time
+
+from afterstates import afterstates_from_rows, pack_rows, rows_from_grid
+from tetris_engine import DOWN, LEFT, RIGHT, ROTATE
+
+# Reference Tetris bot. Placements are scored with the usual board features
+# (aggregate height, holes, bumpiness, lines cleared), which every Afterstate
+# carries, and searched with a beam over the known pieces: the current one
+# plus next_piece, the same piece draw_sidebar shows. A transposition table
+# keyed by the packed board and the pieces still to place means a board
+# reached through two move orders is only searched once.
+
+# Weights from the well-known hand-tuned four-feature player
+DEFAULT_WEIGHTS = {
+    'height': -0.510066,
+    'lines': 0.760666,
+    'holes': -0.35663,
+    'bumpiness': -0.184483,
+}
+
+LOSS = float('-inf')
+
+
+class HeuristicAgent:
+    # The search is bounded by beam_width and the pieces known, so a move
+    # depends only on the board and pieces, as rollouts and replays need.
+    # time_budget_ms cuts it short instead, for the interactive hint, and
+    # makes the move depend on how fast the machine is.
+    def __init__(self, weights=None, beam_width=6, time_budget_ms=None, table_size=50000):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.beam_width = beam_width
+        self.time_budget_ms = time_budget_ms
+        self.table_size = table_size
+        self.table = {}
+
+    def evaluate(self, features):
+        w = self.weights
+        return w['height'] * features.height + w['holes'] * features.holes + w['bumpiness'] * features.bumpiness
+
+    def _static(self, placement):
+        return self.weights['lines'] * placement.lines_cleared + self.evaluate(placement.features)
+
+    def _search(self, placement, pieces, level, deadline=None):
+        # Best value reachable from an Afterstate by placing pieces in order,
+        # beam-pruned on the static value of each placement. None when
+        # deadline passes first; only complete values go in the table.
+        if not pieces:
+            return self.evaluate(placement.features)
+        key = (pack_rows(placement.rows), pieces)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+
+        children = afterstates_from_rows(placement.rows, pieces[0], level)
+        if not children:
+            value = LOSS
+        else:
+            beam = sorted(children, key=self._static, reverse=True)[:self.beam_width]
+            lines_weight = self.weights['lines']
+            value = LOSS
+            for child in beam:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return None
+                child_value = self._search(child, pieces[1:], level, deadline)
+                if child_value is None:
+                    return None
+                value = max(value, lines_weight * child.lines_cleared + child_value)
+
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = value
+        return value
+
+    def choose(self, rows, current_type, next_type=None, level=1):
+        # Returns the Afterstate to aim for, or None when the piece cannot be placed.
+        # Candidates are searched best-first; when the time budget runs out the
+        # best one searched so far is kept, or the best static placement.
+        deadline = None
+        if self.time_budget_ms is not None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+        children = afterstates_from_rows(rows, current_type, level)
+        if not children:
+            return None
+        following = (next_type,) if next_type is not None else ()
+        lines_weight = self.weights['lines']
+
+        beam = sorted(children, key=self._static, reverse=True)[:self.beam_width]
+        best = beam[0]
+        best_value = LOSS
+        for child in beam:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            value = self._search(child, following, level, deadline)
+            if value is None:
+                break
+            value += lines_weight * child.lines_cleared
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def choose_for(self, state):
+        # Convenience wrapper around choose for a TetrisState
+        if state.board is not None:
+            rows = tuple(state.board.rows)
+        else:
+            rows = rows_from_grid(state.grid)
+        return self.choose(rows, state.current_piece.type_id, state.next_piece.type_id, state.level)
+
+
+class AgentPolicy:
+    # Turns the agent's placements into TetrisState.step actions: rotate,
+    # shift to the target column, then soft drop. Plans once per piece.
+    def __init__(self, agent=None):
+        self.agent = agent or HeuristicAgent()
+        self.piece = None
+        self.target = None
+
+    def __call__(self, state, rng=None):
+        piece = state.current_piece
+        if piece is not self.piece:
+            self.piece = piece
+            self.target = self.agent.choose_for(state)
+        target = self.target
+        if target is None:
+            return DOWN
+        if piece.rotation != target.rotation:
+            return ROTATE
+        if piece.x > target.x:
+            return LEFT
+        if piece.x < target.x:
+            return RIGHT
+        return DOWN
@@ -0,0 +1,165 @@
+import time
+
+import numpy as np
+
+from tetris_engine import COLUMNS, ROWS, LINE_CLEAR_POINTS, PLACEMENTS, ROTATION_INFO, SHAPES
+
+# N Tetris boards held in one (N, ROWS, COLUMNS) uint8 array and advanced in
+# lockstep. One step places the current piece of every board: each board picks
+# a (rotation, x) and the piece is dropped straight down from row 0, locked,
+# full rows are removed and NES points are added, all without a Python loop
+# over boards. Cell values match the scalar grid (type_id + 1, 0 for empty).
+
+PIECE_COUNT = len(SHAPES)
+
+# Cell offsets of every rotation state, shape (pieces, 4 rotations, 4 cells)
+CELL_X = np.array([[[x for x, _ in info.cells] for info in states] for states in ROTATION_INFO])
+CELL_Y = np.array([[[y for _, y in info.cells] for info in states] for states in ROTATION_INFO])
+
+# Legal x range per (piece, rotation)
+MIN_X = np.array([[-info.left for info in states] for states in ROTATION_INFO])
+MAX_X = np.array([[COLUMNS - 1 - info.right for info in states] for states in ROTATION_INFO])
+
+# Spawn column used by Tetromino for rotation 0
+SPAWN_X = np.array([COLUMNS // 2 - states[0].width // 2 for states in ROTATION_INFO])
+
+# PLACEMENTS padded to a dense table so random moves can be drawn per board
+PLACEMENT_COUNTS = np.array([len(pairs) for pairs in PLACEMENTS])
+PLACEMENT_TABLE = np.zeros((PIECE_COUNT, PLACEMENT_COUNTS.max(), 2), dtype=np.int64)
+for _piece, _pairs in enumerate(PLACEMENTS):
+    PLACEMENT_TABLE[_piece, :len(_pairs)] = _pairs
+
+# Points indexed by the number of rows cleared, before the level multiplier
+POINTS = np.array([0] + [LINE_CLEAR_POINTS[n] for n in range(1, 5)], dtype=np.int64)
+
+
+class BatchTetris:
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((n, ROWS, COLUMNS), dtype=np.uint8)
+        self.pieces = np.zeros(n, dtype=np.int64)
+        self.next_pieces = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.lines_cleared = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.reset()
+
+    def reset(self, indices=None):
+        if indices is None:
+            indices = np.arange(self.n)
+        count = len(indices)
+        self.boards[indices] = 0
+        self.pieces[indices] = self.rng.integers(0, PIECE_COUNT, count)
+        self.next_pieces[indices] = self.rng.integers(0, PIECE_COUNT, count)
+        self.score[indices] = 0
+        self.lines_cleared[indices] = 0
+        self.level[indices] = 1
+        self.game_over[indices] = False
+
+    def reset_finished(self):
+        finished = np.flatnonzero(self.game_over)
+        if len(finished):
+            self.reset(finished)
+        return finished
+
+    def column_tops(self, boards=None):
+        # Index of the highest filled cell in every column, ROWS when empty
+        filled = (self.boards if boards is None else boards) != 0
+        tops = filled.argmax(axis=1)
+        tops[~filled.any(axis=1)] = ROWS
+        return tops
+
+    def blocks_below(self, boards=None):
+        # blocks_below[b, y, x] is the first filled row >= y in column x, ROWS when none
+        boards = self.boards if boards is None else boards
+        rows = np.where(boards != 0, np.arange(ROWS)[None, :, None], ROWS)
+        return np.minimum.accumulate(rows[:, ::-1], axis=1)[:, ::-1]
+
+    def random_actions(self):
+        choice = (self.rng.random(self.n) * PLACEMENT_COUNTS[self.pieces]).astype(np.int64)
+        picked = PLACEMENT_TABLE[self.pieces, choice]
+        return picked[:, 0], picked[:, 1]
+
+    def step(self, rotations, xs):
+        # Returns the points each board scored; boards that are over score nothing
+        active = np.flatnonzero(~self.game_over)
+        gained = np.zeros(self.n, dtype=np.int64)
+        if not len(active):
+            return gained
+
+        pieces = self.pieces[active]
+        rotations = np.asarray(rotations)[active] % 4
+        xs = np.clip(np.asarray(xs)[active], MIN_X[pieces, rotations], MAX_X[pieces, rotations])
+        cell_x = xs[:, None] + CELL_X[pieces, rotations]
+        cell_y = CELL_Y[pieces, rotations]
+
+        # Drop from row 0 like gravity does: each cell stops one row above the
+        # first block at or below its starting row in its column
+        boards = self.boards[active]
+        below = self.blocks_below(boards)
+        board_rows = np.arange(len(active))[:, None]
+        landing = (below[board_rows, cell_y, cell_x] - 1 - cell_y).min(axis=1)
+
+        # A piece that cannot enter the board ends that game without locking
+        blocked = landing < 0
+        self.game_over[active[blocked]] = True
+        placed = ~blocked
+        active, pieces, landing = active[placed], pieces[placed], landing[placed]
+        cell_x, cell_y, boards = cell_x[placed], cell_y[placed], boards[placed]
+
+        # Lock
+        board_rows = np.arange(len(active))[:, None]
+        boards[board_rows, landing[:, None] + cell_y, cell_x] = (pieces + 1)[:, None]
+
+        # Line detection and compaction: a stable sort moves full rows to the top
+        # while keeping the remaining rows in order, then the moved rows are emptied
+        full = (boards != 0).all(axis=2)
+        cleared = full.sum(axis=1)
+        clearing = np.flatnonzero(cleared)
+        if len(clearing):
+            order = np.argsort(~full[clearing], axis=1, kind='stable')
+            compacted = np.take_along_axis(boards[clearing], order[:, :, None], axis=1)
+            compacted[np.arange(ROWS)[None, :] < cleared[clearing, None]] = 0
+            boards[clearing] = compacted
+
+        # NES scoring
+        level = self.level[active]
+        points = POINTS[cleared] * level
+        gained[active] = points
+        self.score[active] += points
+        lines = self.lines_cleared[active] + cleared
+        self.lines_cleared[active] = lines
+        level = lines // 10 + 1
+        level[level >= 256] = 1
+        self.level[active] = level
+        self.boards[active] = boards
+
+        # Next piece; the game is over when it collides at its spawn position
+        spawned = self.next_pieces[active]
+        self.pieces[active] = spawned
+        self.next_pieces[active] = self.rng.integers(0, PIECE_COUNT, len(active))
+        spawn_x = SPAWN_X[spawned][:, None] + CELL_X[spawned, 0]
+        spawn_y = CELL_Y[spawned, 0]
+        self.game_over[active] = (boards[board_rows, spawn_y, spawn_x] != 0).any(axis=1)
+        return gained
+
+
+def measure_throughput(sizes=(1, 16, 256, 4096), steps=200, seed=0):
+    # Placements per second for each batch size, running random moves with auto-reset
+    results = []
+    for n in sizes:
+        env = BatchTetris(n, seed=seed)
+        start = time.perf_counter()
+        for _ in range(steps):
+            env.step(*env.random_actions())
+            env.reset_finished()
+        elapsed = time.perf_counter() - start
+        results.append((n, n * steps / elapsed))
+    return results
+
+
+if __name__ == "__main__":
+    for n, rate in measure_throughput():
+        print(f"N={n:>5}: {rate:>12,.0f} placements/s")
@@ -0,0 +1,176 @@
+from collections import namedtuple
+
+from tetris_engine import COLUMNS, ROWS, ROTATIONS, ROTATION_INFO
+
+# Alternative board backend: each row is an int with bit x set when column x
+# is filled. Collision is a handful of ANDs and a full row is a single compare.
+# The colour grid is kept alongside purely so the front end can draw it.
+#
+# A surface index is updated on every lock and line clear: tops[x] is the
+# highest filled row of column x (ROWS when empty) and counts[x] the number of
+# filled cells in it. Drop distances and board features are read from it in
+# O(COLUMNS) instead of walking the piece down or scanning the board.
+
+FULL_ROW = (1 << COLUMNS) - 1
+
+# aggregate height, holes (empty cells under a column's top), bumpiness (sum of
+# height steps between neighbours) and wells (depth of columns lower than both
+# neighbours, walls counting as full height)
+BoardFeatures = namedtuple('BoardFeatures', ['height', 'holes', 'bumpiness', 'wells'])
+
+
+def build_piece_mask(shape):
+    # Row masks relative to the piece origin
+    return tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in shape)
+
+
+# PIECE_MASKS[type_id][rotation], laid out like ROTATIONS
+PIECE_MASKS = [[build_piece_mask(shape) for shape in states] for states in ROTATIONS]
+
+
+def surface_features(tops, filled):
+    # BoardFeatures of a board with column tops laid out like BitBoard.tops
+    # and filled cells in all
+    heights = [ROWS - top for top in tops]
+    height = sum(heights)
+    bumpiness = 0
+    wells = 0
+    for x, h in enumerate(heights):
+        left = heights[x - 1] if x > 0 else ROWS
+        right = heights[x + 1] if x < COLUMNS - 1 else ROWS
+        if x < COLUMNS - 1:
+            bumpiness += abs(h - right)
+        depth = min(left, right) - h
+        if depth > 0:
+            wells += depth
+    return BoardFeatures(height, height - filled, bumpiness, wells)
+
+
+def scan_tops(rows):
+    # Column tops of a board known only by its rows
+    tops = [ROWS] * COLUMNS
+    covered = 0
+    for y, mask in enumerate(rows):
+        new = mask & ~covered
+        while new:
+            bit = new & -new
+            tops[bit.bit_length() - 1] = y
+            new ^= bit
+        covered |= mask
+    return tops
+
+
+class BitBoard:
+    def __init__(self):
+        self.rows = [0] * ROWS
+        self.colors = [[0 for _ in range(COLUMNS)] for _ in range(ROWS)]
+        self.tops = [ROWS] * COLUMNS
+        self.counts = [0] * COLUMNS
+
+    @classmethod
+    def from_grid(cls, grid):
+        board = cls()
+        tops = board.tops
+        counts = board.counts
+        for y, row in enumerate(grid):
+            mask = 0
+            for x, cell in enumerate(row):
+                if cell:
+                    mask |= 1 << x
+                    counts[x] += 1
+                    if y < tops[x]:
+                        tops[x] = y
+            board.rows[y] = mask
+            board.colors[y] = row[:]
+        return board
+
+    def collides(self, type_id, rotation, piece_x, piece_y):
+        info = ROTATION_INFO[type_id][rotation]
+        if piece_x + info.left < 0 or piece_x + info.right >= COLUMNS:
+            return True
+        row_masks = PIECE_MASKS[type_id][rotation]
+        if piece_y + len(row_masks) > ROWS:
+            return True
+        rows = self.rows
+        for i, mask in enumerate(row_masks):
+            y = piece_y + i
+            if y >= 0 and rows[y] & (mask << piece_x):
+                return True
+        return False
+
+    def collision(self, piece, dx=0, dy=0):
+        return self.collides(piece.type_id, piece.rotation, piece.x + dx, piece.y + dy)
+
+    def drop_distance(self, piece):
+        # Rows the piece can fall. While the piece is above the surface this
+        # is the smallest gap between its lowest cell and the top of each
+        # column it covers; a piece tucked under an overhang is walked down.
+        info = ROTATION_INFO[piece.type_id][piece.rotation]
+        tops = self.tops
+        x = piece.x
+        y = piece.y
+        distance = ROWS
+        for column, bottom in zip(info.columns, info.bottom):
+            gap = tops[x + column] - y - bottom - 1
+            if gap < 0:
+                return self.scan_drop_distance(piece)
+            if gap < distance:
+                distance = gap
+        return distance
+
+    def scan_drop_distance(self, piece):
+        distance = 0
+        while not self.collides(piece.type_id, piece.rotation, piece.x, piece.y + distance + 1):
+            distance += 1
+        return distance
+
+    def heights(self):
+        return [ROWS - top for top in self.tops]
+
+    def features(self):
+        return surface_features(self.tops, sum(self.counts))
+
+    def lock(self, piece):
+        rows = self.rows
+        colors = self.colors
+        tops = self.tops
+        counts = self.counts
+        for i, row in enumerate(piece.shape):
+            y = piece.y + i
+            for x, cell in enumerate(row):
+                if cell:
+                    column = piece.x + x
+                    rows[y] |= 1 << column
+                    colors[y][column] = cell
+                    counts[column] += 1
+                    if y < tops[column]:
+                        tops[column] = y
+
+    def find_cleared_lines(self):
+        return [y for y, mask in enumerate(self.rows) if mask == FULL_ROW]
+
+    def clear_lines(self, cleared_lines):
+        # Compact by slicing out the full rows; both arrays are updated in place
+        count = len(cleared_lines)
+        if not count:
+            return
+        self.rows[:] = [0] * count + [mask for mask in self.rows if mask != FULL_ROW]
+        self.colors[:] = ([[0] * COLUMNS for _ in range(count)]
+                          + [row for y, row in enumerate(self.colors) if y not in cleared_lines])
+
+        # Full rows take one cell from every column. A column's top row moves
+        # down by the cleared rows under it; when the top row itself was
+        # cleared, the new top is found by walking down from there.
+        rows = self.rows
+        tops = self.tops
+        for x in range(COLUMNS):
+            self.counts[x] -= count
+            top = tops[x]
+            if top == ROWS:
+                continue
+            y = count + top - sum(1 for cleared in cleared_lines if cleared < top)
+            if top in cleared_lines:
+                bit = 1 << x
+                while y < ROWS and not rows[y] & bit:
+                    y += 1
+            tops[x] = y
@@ -1,126 +1,73 @@
+import argparse
 import pygame
-import random
 import sys
-import csv
 import os
-from datetime import datetime
 
-# Initialize Pygame
-pygame.init()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+import paths
+
+from assets import FONTS
+from profiler import ANIMATION, INPUT, OVERLAY_FONT, PRESENT, RENDER, UPDATE, WAIT, FrameProfiler
+from replay import Recorder, load, new_seed, new_session
+from timestep import FixedTimestep
+from score_store import ScoreStore
+from afterstates import drop_piece
+from agent import HeuristicAgent
+from tetris_engine import (
+    COLUMNS, ROWS, COLORS, ROTATION_INFO, DOWN, LEFT, RIGHT, ROTATE, TICK_MS,
+    create_grid
+)
 
 # Game constants
 SCREEN_WIDTH = 500
 SCREEN_HEIGHT = 600
 BLOCK_SIZE = 30
-COLUMNS = 10
-ROWS = SCREEN_HEIGHT // BLOCK_SIZE
-
-NES_SPEEDS = {
-    0: 800, 1: 720, 2: 630, 3: 550, 4: 470,
-    5: 380, 6: 300, 7: 220, 8: 130, 9: 100,
-    10: 80, 11: 80, 12: 80, 13: 70, 14: 70, 15: 70,
-    16: 50, 17: 50, 18: 50, 19: 30, 20: 30, 21: 30,
-    22: 20, 23: 20, 24: 20, 25: 20, 26: 20, 27: 20, 28: 20, 29: 20
-}
-
 
 # Colors
 BLACK = (0, 0, 0)
 GRAY = (128, 128, 128)
 WHITE = (255, 255, 255)
-COLORS = [
-    (0, 255, 255),  # Cyan
-    (0, 0, 255),    # Blue
-    (255, 165, 0),  # Orange
-    (255, 255, 0),  # Yellow
-    (0, 255, 0),    # Green
-    (160, 32, 240), # Purple
-    (255, 0, 0)     # Red
-]
-
-# Tetromino shapes
-SHAPES = [
-    [[1, 1, 1, 1]],  # I
-    [[2, 0, 0], [2, 2, 2]],  # J
-    [[0, 0, 3], [3, 3, 3]],  # L
-    [[4, 4], [4, 4]],  # O
-    [[0, 5, 5], [5, 5, 0]],  # S
-    [[0, 6, 0], [6, 6, 6]],  # T
-    [[7, 7, 0], [0, 7, 7]]   # Z
-]
-
-# Initialize screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Tetris")
-
-clock = pygame.time.Clock()
-base_fall_speed = 1000  # milliseconds
-
-font = pygame.font.SysFont("Arial", 24)
-
-class Tetromino:
-    def __init__(self, shape, type_id):
-        self.shape = shape
-        self.type_id = type_id
-        self.color = COLORS[type_id]  # Direct color assignment by type
-        self.x = COLUMNS // 2 - len(shape[0]) // 2
-        self.y = 0
 
-    def rotate(self):
-        self.shape = [list(row) for row in zip(*self.shape[::-1])]
-
-    def collision(self, grid, dx=0, dy=0):
-        for y, row in enumerate(self.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    new_x = self.x + x + dx
-                    new_y = self.y + y + dy
-                    if new_x < 0 or new_x >= COLUMNS or new_y >= ROWS:
-                        return True
-                    if new_y >= 0 and grid[new_y][new_x]:
-                        return True
-        return False
-
-    def lock(self, grid):
-        for y, row in enumerate(self.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    grid[self.y + y][self.x + x] = cell
+# Fonts as (name, size), loaded through assets.FONTS
+UI_FONT = ('Arial', 24)
+POPUP_FONT = ('Arial', 80)
 
-def save_score(score):
-    filename = 'tetris_scores.csv'
-    file_exists = os.path.isfile(filename)
+base_fall_speed = 1000  # milliseconds
 
-    scores = []
-    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+# Created by init_display() when the front end starts, so importing this
+# module opens no window and loads no fonts
+screen = None
+clock = None
+font = None
 
-    # Read existing scores
-    if file_exists:
-        with open(filename, 'r', newline='') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                scores.append({'Score': int(row['Score']), 'Date': row['Date']})
+# Opened by the first save_score() and kept for the rest of the process
+score_store = None
 
-    # Add the new score
-    scores.append({'Score': score, 'Date': current_time})
 
-    # Sort scores in descending order
-    scores.sort(key=lambda x: x['Score'], reverse=True)
+def init_display():
+    global screen, clock, font
+    if screen is not None:
+        return screen
 
-    # Recalculate ranks and write all scores back to the file
-    with open(filename, 'w', newline='') as file:
-        fieldnames = ['Rank', 'Score', 'Date']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
+    # Initialize Pygame
+    pygame.init()
 
-        for idx, entry in enumerate(scores, start=1):
-            writer.writerow({'Rank': idx, 'Score': entry['Score'], 'Date': entry['Date']})
+    # Initialize screen
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Tetris")
 
-def get_nes_speed(level):
-    return NES_SPEEDS.get(level, 20)
+    clock = pygame.time.Clock()
+    load_ms = FONTS.preload([UI_FONT, POPUP_FONT, OVERLAY_FONT])
+    print(f"Fonts loaded in {load_ms:.1f} ms")
+    font = FONTS.get(*UI_FONT)
+    return screen
 
-def create_grid():
-    return [[0 for _ in range(COLUMNS)] for _ in range(ROWS)]
+def save_score(score):
+    # Append-only store; the old CSV is imported the first time it is created
+    global score_store
+    if score_store is None:
+        score_store = ScoreStore('tetris_scores', legacy_csv='tetris_scores.csv')
+    return score_store.add(score)
 
 def draw_grid(surface, grid):
     surface.fill(BLACK)
@@ -134,48 +81,6 @@ def draw_grid(surface, grid):
     for y in range(ROWS):
         pygame.draw.line(surface, GRAY, (0, y * BLOCK_SIZE), (COLUMNS * BLOCK_SIZE, y * BLOCK_SIZE))
 
-def draw_tetromino(surface, tetromino):
-    for y, row in enumerate(tetromino.shape):
-        for x, cell in enumerate(row):
-            if cell:
-                pygame.draw.rect(
-                    surface, tetromino.color,
-                    ((tetromino.x + x) * BLOCK_SIZE, (tetromino.y + y) * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
-                )
-
-def clear_lines(grid, screen, clock):
-    lines_to_clear = []
-    for i, row in enumerate(grid):
-        if 0 not in row:
-            lines_to_clear.append(i)
-
-    if not lines_to_clear:
-        return 0
-
-    # Animate line clear from center outwards
-    for step in range(BLOCK_SIZE // 2 + 1):
-        for line in lines_to_clear:
-            center = COLUMNS // 2
-            left = center - step - 1
-            right = center + step
-
-            if left >= 0:
-                grid[line][left] = 0
-            if right < COLUMNS:
-                grid[line][right] = 0
-
-        draw_grid(screen, grid)
-        pygame.display.update()
-        clock.tick(30)
-
-    # Drop remaining lines
-    for line in reversed(lines_to_clear):
-        for i in range(line, 0, -1):
-            grid[i] = grid[i - 1][:]
-        grid[0] = [0 for _ in range(COLUMNS)]
-
-    return len(lines_to_clear)
-
 def draw_sidebar(surface, score, lines, level, next_piece):
     sidebar = pygame.Surface((200, SCREEN_HEIGHT))
     sidebar.fill(BLACK)
@@ -200,280 +105,374 @@ def draw_sidebar(surface, score, lines, level, next_piece):
 
     surface.blit(sidebar, (COLUMNS * BLOCK_SIZE, 0))
 
-def draw_ghost_piece(surface, grid, tetromino):
-    # Create ghost with the same type_id and shape
-    ghost = Tetromino(tetromino.shape, tetromino.type_id)
-    ghost.x = tetromino.x
-    ghost.y = tetromino.y
-    ghost.color = (200, 200, 200)  # Light gray ghost color for ghost piece
+def hint_cells(board, type_id, placement):
+    # Board cells the agent's placement would fill once dropped
+    if placement is None:
+        return []
+    y = drop_piece(board.rows, type_id, placement.rotation, placement.x)
+    if y is None:
+        return []
+    return [(placement.x + x, y + dy) for x, dy in ROTATION_INFO[type_id][placement.rotation].cells]
+
+GHOST_COLOR = (200, 200, 200)
+SIDEBAR_X = COLUMNS * BLOCK_SIZE
+
+
+class DirtyRenderer:
+    # Draws the board, the falling piece with its ghost and hint outlines, and
+    # the sidebar, repainting only what changed since the last frame. The
+    # empty playfield comes from draw_grid and a full redraw paints the
+    # sidebar with draw_sidebar. draw() returns the rects to pass to
+    # pygame.display.update. Anything that paints the screen behind its back
+    # (the line clear animation) must call invalidate().
+    def __init__(self, surface):
+        self.surface = surface
+        # Empty playfield with its grid lines, used to wipe single cells
+        self.background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        draw_grid(self.background, create_grid())
+        self.invalidate()
+
+    def invalidate(self):
+        self.grid = [[None] * COLUMNS for _ in range(ROWS)]
+        self.overlay = {}
+        self.texts = {}
+        self.next_shape = None
+        self.stale = []
+        self.full_redraw = True
+
+    def invalidate_area(self, rect):
+        # Something was painted over rect; restore it on the next draw
+        self.stale.append(pygame.Rect(rect))
+
+    def restore_stale(self):
+        rects = []
+        for rect in self.stale:
+            rect = rect.clip(self.surface.get_rect())
+            self.surface.blit(self.background, rect, rect)
+            rects.append(rect)
+            for y in range(max(rect.top // BLOCK_SIZE, 0), min((rect.bottom - 1) // BLOCK_SIZE + 1, ROWS)):
+                for x in range(max(rect.left // BLOCK_SIZE, 0), min((rect.right - 1) // BLOCK_SIZE + 1, COLUMNS)):
+                    self.grid[y][x] = None
+            if rect.right > SIDEBAR_X:
+                self.texts = {}
+                self.next_shape = None
+        self.stale = []
+        return rects
+
+    def draw_cell(self, x, y, value, overlay):
+        rect = pygame.Rect(x * BLOCK_SIZE, y * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+        surface = self.surface
+        surface.blit(self.background, rect, rect)
+        if value:
+            surface.fill(COLORS[value - 1], rect)
+            # Grid lines are drawn over locked blocks, as in draw_grid
+            pygame.draw.line(surface, GRAY, rect.topleft, (rect.left, rect.bottom - 1))
+            pygame.draw.line(surface, GRAY, rect.topleft, (rect.right - 1, rect.top))
+        if overlay:
+            ghost, hint, color = overlay
+            if ghost:
+                pygame.draw.rect(surface, GHOST_COLOR, rect, 1)
+            if hint:
+                pygame.draw.rect(surface, WHITE, rect, 3)
+            if color:
+                surface.fill(color, rect)
+        return rect
+
+    @staticmethod
+    def sidebar_texts(state):
+        # (key, text, y) of each sidebar line, laid out as draw_sidebar does
+        return (('score', f"Score: {state.score}", 30),
+                ('lines', f"Lines: {state.lines_cleared}", 60),
+                ('level', f"Level: {state.level}", 90),
+                ('next', "Next:", 120))
+
+    def draw_text(self, key, text, y):
+        if self.texts.get(key) == text:
+            return None
+        self.texts[key] = text
+        rect = pygame.Rect(SIDEBAR_X, y, SCREEN_WIDTH - SIDEBAR_X, font.get_linesize())
+        self.surface.fill(BLACK, rect)
+        self.surface.blit(font.render(text, True, WHITE), (SIDEBAR_X + 10, y))
+        return rect
+
+    def draw_next_piece(self, next_piece):
+        if self.next_shape is next_piece.shape:
+            return None
+        self.next_shape = next_piece.shape
+        rect = pygame.Rect(SIDEBAR_X, 150, SCREEN_WIDTH - SIDEBAR_X, 4 * BLOCK_SIZE)
+        self.surface.fill(BLACK, rect)
+        for y, row in enumerate(next_piece.shape):
+            for x, cell in enumerate(row):
+                if cell:
+                    pygame.draw.rect(
+                        self.surface, next_piece.color,
+                        (SIDEBAR_X + 10 + x * BLOCK_SIZE, 150 + y * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+                    )
+        return rect
+
+    def draw(self, state, ghost_y, hint=(), grid=None):
+        # grid replaces state.grid, e.g. the pre-clear board during the line
+        # clear wipe, and then no piece is drawn over it; ghost_y None leaves
+        # out the ghost piece
+        live = grid is None
+        if live:
+            grid = state.grid
+        rects = []
+        if self.full_redraw:
+            self.surface.blit(self.background, (0, 0))
+            self.stale = []
+            draw_sidebar(self.surface, state.score, state.lines_cleared, state.level, state.next_piece)
+            self.texts = {key: text for key, text, _ in self.sidebar_texts(state)}
+            self.next_shape = state.next_piece.shape
+        else:
+            rects.extend(self.restore_stale())
+
+        # Per-cell overlay: (ghost outline, hint outline, falling piece colour)
+        piece = state.current_piece
+        overlay = {}
+        if live:
+            if ghost_y is not None:
+                for x, y in ROTATION_INFO[piece.type_id][piece.rotation].cells:
+                    overlay[(piece.x + x, ghost_y + y)] = (True, False, None)
+            for cell in hint:
+                ghost = overlay.get(cell, (False,))[0]
+                overlay[cell] = (ghost, True, None)
+            for x, y in ROTATION_INFO[piece.type_id][piece.rotation].cells:
+                overlay[(piece.x + x, piece.y + y)] = (False, False, piece.color)
+
+        changed = set()
+        for y, row in enumerate(grid):
+            drawn = self.grid[y]
+            if row != drawn:
+                for x in range(COLUMNS):
+                    if row[x] != drawn[x]:
+                        changed.add((x, y))
+                self.grid[y] = row[:]
+        for cell in overlay.keys() | self.overlay.keys():
+            if overlay.get(cell) != self.overlay.get(cell):
+                changed.add(cell)
+        self.overlay = overlay
+
+        for x, y in changed:
+            if 0 <= x < COLUMNS and 0 <= y < ROWS:
+                rects.append(self.draw_cell(x, y, grid[y][x], overlay.get((x, y))))
+
+        for key, text, y in self.sidebar_texts(state):
+            rect = self.draw_text(key, text, y)
+            if rect:
+                rects.append(rect)
+        rect = self.draw_next_piece(state.next_piece)
+        if rect:
+            rects.append(rect)
+
+        if self.full_redraw:
+            self.full_redraw = False
+            return [self.surface.get_rect()]
+        return rects
+
+
+SCORE_COLORS = {
+    1: (255, 165, 0),   # Orange
+    2: (255, 255, 0),   # Yellow
+    3: (0, 255, 0),     # Green
+    4: (0, 0, 255)      # Blue
+}
 
-    # Drop the ghost as far as possible
-    while not ghost.collision(grid, dy=1):
-        ghost.y += 1
 
-    # Draw the ghost as an outline
-    for y, row in enumerate(ghost.shape):
-        for x, cell in enumerate(row):
-            if cell:
-                pygame.draw.rect(
-                    surface, ghost.color,
-                    ((ghost.x + x) * BLOCK_SIZE, (ghost.y + y) * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE),
-                    1  # Outline only for ghost
-                )
+class LineClearEffect:
+    # Line clear animation, drawn once per frame instead of blocking. While
+    # the controller holds the board frozen after the clear, the cleared rows
+    # are wiped from the middle outward on a copy of the pre-clear board, as
+    # far as its pause has run; then the "+points" popup shows over the live
+    # game for POPUP_MS.
+    POPUP_MS = 1000
+
+    def __init__(self, grid, cleared_lines, points_earned, lines_cleared_now, wipe_ms):
+        self.grid = [row[:] for row in grid]
+        self.cleared_lines = cleared_lines
+        self.color = SCORE_COLORS.get(lines_cleared_now, (255, 255, 255))
+        self.flash_border = (lines_cleared_now == 4)
+        self.mid = COLUMNS // 2
+        self.steps = self.mid + 1
+        self.step = -1
+        self.wipe_ms = wipe_ms
+        self.wiping = True
+        self.popup_left = self.POPUP_MS
+        self.text = FONTS.get(*POPUP_FONT).render(f"+{points_earned}", True, self.color)
+
+    @property
+    def done(self):
+        return self.popup_left <= 0
+
+    def wipe(self, pause_left):
+        # Show the wipe as far as the controller's clear pause has run
+        elapsed = self.wipe_ms - pause_left
+        target = min(elapsed * self.steps // self.wipe_ms, self.steps - 1)
+        while self.step < target:
+            self.step += 1
+            for line in self.cleared_lines:
+                left_idx = self.mid - self.step
+                right_idx = self.mid + self.step
+                if 0 <= left_idx < COLUMNS:
+                    self.grid[line][left_idx] = 0
+                if 0 <= right_idx < COLUMNS and right_idx != left_idx:
+                    self.grid[line][right_idx] = 0
+
+    def popup(self, dt):
+        # The board is live again; count down the popup
+        self.wiping = False
+        self.popup_left -= dt
+
+    def draw(self, surface):
+        # Returns the rects painted on top of the renderer's output
+        if self.wiping:
+            if self.flash_border:
+                rect = pygame.Rect(0, 0, COLUMNS * BLOCK_SIZE, ROWS * BLOCK_SIZE)
+                pygame.draw.rect(surface, (255, 255, 255), rect, 5)
+                return [rect]
+            return []
+        rect = self.text.get_rect(center=(surface.get_width() // 2, surface.get_height() // 2))
+        surface.blit(self.text, rect)
+        return [rect]
+
+
+KEY_ACTIONS = {
+    pygame.K_LEFT: LEFT,
+    pygame.K_RIGHT: RIGHT,
+    pygame.K_DOWN: DOWN,
+    pygame.K_UP: ROTATE,
+}
 
 
-def spawn_piece():
-    index = random.randint(0, len(SHAPES) - 1)
-    return Tetromino([row[:] for row in SHAPES[index]], index)
-
-def find_cleared_lines(grid):
-    return [y for y, row in enumerate(grid) if all(row)]
-
-def flash_lines(screen, grid, lines_to_clear):
-    flash_time = 200  # milliseconds per flash
-    flash_cycles = 3  # number of flash cycles
-
-    for _ in range(flash_cycles):
-        # Draw white lines
-        for y in lines_to_clear:
-            for x in range(COLUMNS):
-                pygame.draw.rect(screen, WHITE, (x * BLOCK_SIZE, y * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE))
-        pygame.display.update()
-        pygame.time.wait(flash_time // 2)
-
-        # Redraw original grid
-        draw_grid(screen, grid)
-        pygame.display.update()
-        pygame.time.wait(flash_time // 2)
-
-def shift_blocks_down(grid, lines_to_clear):
-    # Sort lines descending
-    for line in sorted(lines_to_clear, reverse=True):
-        del grid[line]
-    # Insert empty rows on top
-    for _ in lines_to_clear:
-        grid.insert(0, [0] * len(grid[0]))
-
-
-def shift_lines(grid, lines_to_clear):
-    # Sort lines descending to delete from bottom up
-    for line in sorted(lines_to_clear, reverse=True):
-        del grid[line]
-    # Insert empty rows at the top to keep grid size constant
-    for _ in lines_to_clear:
-        grid.insert(0, [0] * len(grid[0]))
-
-
-def animate_line_clear(surface, grid, cleared_lines, points_earned, lines_cleared_now):
-    if not cleared_lines:
-        return
-
-    # Colors for score popup by lines cleared
-    score_colors = {
-        1: (255, 165, 0),   # Orange
-        2: (255, 255, 0),   # Yellow
-        3: (0, 255, 0),     # Green
-        4: (0, 0, 255)      # Blue
-    }
-    score_color = score_colors.get(lines_cleared_now, (255, 255, 255))
-
-    flash_border = (lines_cleared_now == 4)
-    mid = len(grid[0]) // 2
-    steps = mid + 1
-    delay = 50  # ms per step
-
-    big_font = pygame.font.SysFont('Arial', 80)
-
-    # Create a working copy of the grid to animate on
-    temp_grid = [row[:] for row in grid]
-
-    # Animate disappearing lines from middle outward
-    for step in range(steps):
-        for line in cleared_lines:
-            left_idx = mid - step
-            right_idx = mid + step
-            if 0 <= left_idx < len(grid[0]):
-                temp_grid[line][left_idx] = 0
-            if 0 <= right_idx < len(grid[0]) and right_idx != left_idx:
-                temp_grid[line][right_idx] = 0
-
-        draw_grid(surface, temp_grid)
-
-        if flash_border:
-            pygame.draw.rect(surface, (255, 255, 255), (0, 0, len(grid[0]) * BLOCK_SIZE, len(grid) * BLOCK_SIZE), 5)
-
-        pygame.display.update()
-        pygame.time.delay(delay)
-
-    # Gravity shift: remove cleared lines, shift everything above down
-    cleared_lines = sorted(cleared_lines)
-
-    # Build a new grid
-    new_grid = []
-    num_cols = len(grid[0])
-
-    # Keep lines that are not cleared
-    for y in range(len(grid)):
-        if y not in cleared_lines:
-            new_grid.append(grid[y])
-
-    # Add empty lines at the top
-    for _ in range(len(cleared_lines)):
-        new_grid.insert(0, [0 for _ in range(num_cols)])
-
-    # Update the original grid
-    for y in range(len(grid)):
-        grid[y] = new_grid[y][:]
-
-    # Show score popup for 1 second
-    popup_start = pygame.time.get_ticks()
-    while pygame.time.get_ticks() - popup_start < 1000:
-        draw_grid(surface, grid)
-        draw_center_text(surface, f"+{points_earned}", big_font, score_color)
-        pygame.display.update()
-        pygame.time.delay(50)
-
-def draw_center_text(surface, text, font, color):
-    text_surf = font.render(text, True, color)
-    text_rect = text_surf.get_rect(center=(surface.get_width() // 2, surface.get_height() // 2))
-    surface.blit(text_surf, text_rect)
-
-def main():
-    is_saved = False
-    grid = create_grid()
-    current_piece = spawn_piece()
-    next_piece = spawn_piece()
-    fall_time = 0
-    game_over = False
-    score = 0
-    lines_cleared = 0
-    level = 1
-
-    move_left = False
-    move_right = False
-    move_down = False
-
-    move_delay = 100  # Delay between auto moves when holding (ms)
-    move_timer = 0
-    down_move_timer = 0
+def main(replay=None, speed=1.0, profile=False, fast_forward=0):
+    # Plays a live game, recording it under replays/, or renders a loaded
+    # replay at speed times real time (0 for as fast as it draws). The game
+    # runs on TICK_MS simulation ticks; fast_forward runs that many ticks per
+    # rendered frame with the frame rate uncapped. F3 shows frame timings, F4
+    # saves them as a trace under profiles/.
+    init_display()
+    if replay is None:
+        seed = new_seed()
+        recorder = Recorder('tetris', seed)
+    else:
+        seed = replay.seed
+        frames = iter(replay.frames)
+        due = pygame.time.get_ticks()
+    state, controller = new_session('tetris', seed)
+    renderer = DirtyRenderer(screen)
+    agent = HeuristicAgent(time_budget_ms=8)  # fits inside one 60 FPS frame
+    show_hint = False
+    hint_piece = None
+    hint = None
+    effect = None
+    timestep = FixedTimestep(fast_forward)
+    profiler = FrameProfiler(profile)
+    profile_font = FONTS.get(*OVERLAY_FONT)
 
     while True:
-        if game_over:
-            pygame.display.set_caption(f"Tetris - Game Over! Final Score: {score}")
-            save_score(score)
+        if state.game_over:
+            pygame.display.set_caption(f"Tetris - Game Over! Final Score: {state.score}")
+            if replay is None:
+                save_score(state.score)
+                recorder.save_default(state.score, True)
             pygame.time.wait(5000)  # pause 5 seconds so user can see final screen
             return
 
-        if level >= 256:
-            level = 1
-
-        dt = clock.tick(60)
-        fall_time += dt
-        move_timer += dt
-        down_move_timer += dt
-
-        fall_speed = get_nes_speed(level)
-
+        if replay is None:
+            ticks = timestep.ticks(clock.tick(0 if fast_forward else 60))
+        else:
+            frame = next(frames, None)
+            if frame is None:
+                return
+            ticks, inputs = frame
+            if speed > 0:
+                # Hold each recorded frame for its own duration
+                due += ticks * TICK_MS / speed
+                pygame.time.wait(max(int(due) - pygame.time.get_ticks(), 0))
+        profiler.mark(WAIT)
+
+        events = []
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                if replay is None:
+                    recorder.save_default(state.score, False)
                 pygame.quit()
                 sys.exit()
 
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    if not current_piece.collision(grid, dx=-1):
-                        current_piece.x -= 1
-                    move_left = True
-                    move_timer = 0  # Reset hold timer
-
-                if event.key == pygame.K_RIGHT:
-                    if not current_piece.collision(grid, dx=1):
-                        current_piece.x += 1
-                    move_right = True
-                    move_timer = 0  # Reset hold timer
-
-                if event.key == pygame.K_DOWN:
-                    if not current_piece.collision(grid, dy=1):
-                        current_piece.y += 1
-                        score += 1
-                    move_down = True
-                    down_move_timer = 0
-
-                if event.key == pygame.K_UP:
-                    original_shape = current_piece.shape
-                    current_piece.rotate()
-                    if current_piece.collision(grid):
-                        current_piece.shape = original_shape
-
-            if event.type == pygame.KEYUP:
-                if event.key == pygame.K_LEFT:
-                    move_left = False
-                if event.key == pygame.K_RIGHT:
-                    move_right = False
-                if event.key == pygame.K_DOWN:
-                    move_down = False
-
-        # Handle held key movement
-        if move_left and move_timer > move_delay:
-            if not current_piece.collision(grid, dx=-1):
-                current_piece.x -= 1
-            move_timer = 0
-
-        if move_right and move_timer > move_delay:
-            if not current_piece.collision(grid, dx=1):
-                current_piece.x += 1
-            move_timer = 0
-
-        if move_down and down_move_timer > move_delay:
-            if not current_piece.collision(grid, dy=1):
-                current_piece.y += 1
-                score += 1
-            down_move_timer = 0
-
-        # Handle automatic falling
-        # Handle automatic falling
-        if fall_time > fall_speed:
-            fall_time = 0
-            if not current_piece.collision(grid, dy=1):
-                current_piece.y += 1
-            else:
-                current_piece.lock(grid)
-
-                # Detect lines to clear
-                cleared_lines = find_cleared_lines(grid)
-
-                if cleared_lines:
-                    cleared = len(cleared_lines)
-
-                    if cleared == 1:
-                        points = 40 * level
-                    elif cleared == 2:
-                        points = 100 * level
-                    elif cleared == 3:
-                        points = 300 * level
-                    elif cleared == 4:
-                        points = 1200 * level
-                    else:
-                        points = 0
-
-                    score += points
-                    animate_line_clear(screen, grid, cleared_lines, points, cleared)
-                    lines_cleared += cleared
-                    level = lines_cleared // 10 + 1
-
-                current_piece = next_piece
-                next_piece = spawn_piece()
-
-                if current_piece.collision(grid):
-                    game_over = True
-
-        # Drawing
-        draw_grid(screen, grid)
-        draw_ghost_piece(screen, grid, current_piece)
-        draw_tetromino(screen, current_piece)
-        draw_sidebar(screen, score, lines_cleared, level, next_piece)
-        pygame.display.update()
+            if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in KEY_ACTIONS:
+                events.append((event.type == pygame.KEYDOWN, KEY_ACTIONS[event.key]))
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                show_hint = not show_hint
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F4 and profiler.enabled:
+                print(f"Frame trace written to {profiler.export_default('tetris')}")
+
+        if replay is None:
+            inputs = events
+            recorder.frame(ticks, inputs)
+        profiler.mark(INPUT)
+
+        results = controller.frame(ticks, inputs)
+        profiler.mark(UPDATE)
+        for result in results:
+            if result.cleared_lines:
+                # The engine has already collapsed the board; animate on the snapshot
+                effect = LineClearEffect(result.grid, result.cleared_lines, result.points,
+                                         len(result.cleared_lines), controller.clear_pause)
+
+        # The controller's pause after a clear is the one timer: the board is
+        # frozen and wiped while it runs, so both follow simulated time
+        frozen = controller.frozen and effect is not None
+        if frozen:
+            effect.wipe(controller.pause_left)
+        elif effect is not None:
+            effect.popup(ticks * TICK_MS)
+            if effect.done:
+                effect = None
+        profiler.mark(ANIMATION)
+
+        # Drawing: only the cells and sidebar lines that changed are repainted
+        if frozen:
+            rects = renderer.draw(state, None, grid=effect.grid)
+        else:
+            ghost_y = state.current_piece.y + state.board.drop_distance(state.current_piece)
+            cells = ()
+            if show_hint:
+                # Plan once per piece, from its spawn position
+                if hint_piece is not state.current_piece:
+                    hint_piece = state.current_piece
+                    hint = agent.choose_for(state)
+                cells = hint_cells(state.board, state.current_piece.type_id, hint)
+            rects = renderer.draw(state, ghost_y, cells)
+        if effect is not None:
+            for rect in effect.draw(screen):
+                rects.append(rect)
+                renderer.invalidate_area(rect)
+        overlay = profiler.draw_overlay(screen, profile_font)
+        if overlay is not None:
+            rects.append(overlay)
+            renderer.invalidate_area(overlay)
+        profiler.mark(RENDER)
+        pygame.display.update(rects)
+        profiler.mark(PRESENT)
+        profiler.end_frame()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Tetris")
+    parser.add_argument('--replay', help="play back a recorded game instead")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="playback rate for --replay, 0 for as fast as possible")
+    parser.add_argument('--profile', action='store_true',
+                        help="record frame timings from the start (F3 toggles them)")
+    parser.add_argument('--fast-forward', type=int, default=0, metavar='N',
+                        help="run N simulation ticks per frame, uncapped")
+    args = parser.parse_args()
+    replay = load(args.replay) if args.replay else None
+    if replay is not None and replay.game != 'tetris':
+        parser.error(f"{args.replay} is a {replay.game} replay")
+    main(replay, args.speed, args.profile, args.fast_forward)
@@ -0,0 +1,355 @@
+import random
+from collections import namedtuple
+
+# Headless Tetris rules. Nothing in here touches pygame, so the same engine
+# drives the interactive front end in main.py and runs games at full speed.
+
+COLUMNS = 10
+ROWS = 20
+
+NES_SPEEDS = {
+    0: 800, 1: 720, 2: 630, 3: 550, 4: 470,
+    5: 380, 6: 300, 7: 220, 8: 130, 9: 100,
+    10: 80, 11: 80, 12: 80, 13: 70, 14: 70, 15: 70,
+    16: 50, 17: 50, 18: 50, 19: 30, 20: 30, 21: 30,
+    22: 20, 23: 20, 24: 20, 25: 20, 26: 20, 27: 20, 28: 20, 29: 20
+}
+
+# NES points per lock, multiplied by the level
+LINE_CLEAR_POINTS = {1: 40, 2: 100, 3: 300, 4: 1200}
+
+COLORS = [
+    (0, 255, 255),  # Cyan
+    (0, 0, 255),    # Blue
+    (255, 165, 0),  # Orange
+    (255, 255, 0),  # Yellow
+    (0, 255, 0),    # Green
+    (160, 32, 240), # Purple
+    (255, 0, 0)     # Red
+]
+
+# Tetromino shapes
+SHAPES = [
+    [[1, 1, 1, 1]],  # I
+    [[2, 0, 0], [2, 2, 2]],  # J
+    [[0, 0, 3], [3, 3, 3]],  # L
+    [[4, 4], [4, 4]],  # O
+    [[0, 5, 5], [5, 5, 0]],  # S
+    [[0, 6, 0], [6, 6, 6]],  # T
+    [[7, 7, 0], [0, 7, 7]]   # Z
+]
+
+
+def rotate_shape(shape):
+    # Clockwise rotation, the same transform Tetromino.rotate used to apply per key press
+    return [list(row) for row in zip(*shape[::-1])]
+
+
+# Geometry of one rotation state. cells are (x, y) offsets, left/right are the
+# outermost filled columns, and bottom/top hold the lowest and highest filled
+# row of each column from left to right.
+RotationInfo = namedtuple('RotationInfo', [
+    'shape', 'cells', 'width', 'height', 'left', 'right', 'columns', 'bottom', 'top'
+])
+
+
+def build_rotation_info(shape):
+    cells = tuple((x, y) for y, row in enumerate(shape) for x, cell in enumerate(row) if cell)
+    columns = tuple(sorted({x for x, _ in cells}))
+    bottom = tuple(max(y for cx, y in cells if cx == x) for x in columns)
+    top = tuple(min(y for cx, y in cells if cx == x) for x in columns)
+    return RotationInfo(shape, cells, len(shape[0]), len(shape),
+                        columns[0], columns[-1], columns, bottom, top)
+
+
+# ROTATIONS[type_id][r] is the shape after r clockwise turns of SHAPES[type_id]
+ROTATIONS = []
+ROTATION_INFO = []
+for _shape in SHAPES:
+    _states = []
+    for _ in range(4):
+        _states.append(_shape)
+        _shape = rotate_shape(_shape)
+    ROTATIONS.append(_states)
+    ROTATION_INFO.append([build_rotation_info(s) for s in _states])
+
+# Every (rotation, x) at which a piece fits between the walls. Rotations that
+# repeat an earlier shape (O, and the second half of I, S and Z) are skipped.
+PLACEMENTS = []
+for _states in ROTATION_INFO:
+    _seen = []
+    _pairs = []
+    for _r, _info in enumerate(_states):
+        if _info.shape in _seen:
+            continue
+        _seen.append(_info.shape)
+        _pairs.extend((_r, x) for x in range(-_info.left, COLUMNS - _info.right))
+    PLACEMENTS.append(tuple(_pairs))
+
+# Actions accepted by TetrisState.step
+NOOP, LEFT, RIGHT, DOWN, ROTATE = range(5)
+ACTIONS = (NOOP, LEFT, RIGHT, DOWN, ROTATE)
+
+# Returned when a piece locks; grid is the board before the full rows were removed
+LockResult = namedtuple('LockResult', ['cleared_lines', 'points', 'grid'])
+
+
+class Tetromino:
+    def __init__(self, shape, type_id, rotation=0):
+        # shape must be ROTATIONS[type_id][rotation]; the tables are shared, never mutate them
+        self.shape = shape
+        self.type_id = type_id
+        self.rotation = rotation
+        self.color = COLORS[type_id]  # Direct color assignment by type
+        self.x = COLUMNS // 2 - len(shape[0]) // 2
+        self.y = 0
+
+    def rotate(self, turns=1):
+        self.rotation = (self.rotation + turns) % 4
+        self.shape = ROTATIONS[self.type_id][self.rotation]
+
+    def collision(self, grid, dx=0, dy=0):
+        for y, row in enumerate(self.shape):
+            for x, cell in enumerate(row):
+                if cell:
+                    new_x = self.x + x + dx
+                    new_y = self.y + y + dy
+                    if new_x < 0 or new_x >= COLUMNS or new_y >= ROWS:
+                        return True
+                    if new_y >= 0 and grid[new_y][new_x]:
+                        return True
+        return False
+
+    def lock(self, grid):
+        for y, row in enumerate(self.shape):
+            for x, cell in enumerate(row):
+                if cell:
+                    grid[self.y + y][self.x + x] = cell
+
+
+def get_nes_speed(level):
+    return NES_SPEEDS.get(level, 20)
+
+
+def create_grid():
+    return [[0 for _ in range(COLUMNS)] for _ in range(ROWS)]
+
+
+def spawn_piece(rng=random):
+    index = rng.randint(0, len(SHAPES) - 1)
+    return Tetromino(ROTATIONS[index][0], index)
+
+
+def find_cleared_lines(grid):
+    return [y for y, row in enumerate(grid) if all(row)]
+
+
+def line_clear_points(cleared, level):
+    return LINE_CLEAR_POINTS.get(cleared, 0) * level
+
+
+def collapse_lines(grid, cleared_lines):
+    # Remove the cleared rows in place and pad the top with empty rows
+    kept = [row for y, row in enumerate(grid) if y not in cleared_lines]
+    grid[:] = [[0] * COLUMNS for _ in cleared_lines] + kept
+
+
+class TetrisState:
+    def __init__(self, board=None, rng=random):
+        # board is an optional backend such as bitboard.BitBoard; its colour
+        # grid then stands in for the plain list grid. rng is anything with
+        # randint, e.g. a seeded random.Random for reproducible piece order.
+        self.board = board
+        self.rng = rng
+        self.grid = board.colors if board is not None else create_grid()
+        self.current_piece = spawn_piece(rng)
+        self.next_piece = spawn_piece(rng)
+        self.score = 0
+        self.lines_cleared = 0
+        self.level = 1
+        self.game_over = False
+
+    def collision(self, dx=0, dy=0):
+        if self.board is not None:
+            return self.board.collision(self.current_piece, dx, dy)
+        return self.current_piece.collision(self.grid, dx, dy)
+
+    def move(self, dx):
+        if self.collision(dx=dx):
+            return False
+        self.current_piece.x += dx
+        return True
+
+    def rotate(self):
+        self.current_piece.rotate()
+        if self.collision():
+            self.current_piece.rotate(-1)
+            return False
+        return True
+
+    def soft_drop(self):
+        # Player-driven drop, worth one point per row like in main()
+        if self.collision(dy=1):
+            return False
+        self.current_piece.y += 1
+        self.score += 1
+        return True
+
+    def gravity(self):
+        # Advance one fall step. Returns a LockResult when the piece locked.
+        if not self.collision(dy=1):
+            self.current_piece.y += 1
+            return None
+        return self.lock_piece()
+
+    def lock_piece(self):
+        grid = self.grid
+        board = self.board
+        if board is not None:
+            board.lock(self.current_piece)
+            cleared_lines = board.find_cleared_lines()
+        else:
+            self.current_piece.lock(grid)
+            cleared_lines = find_cleared_lines(grid)
+        points = 0
+        before = None
+        if cleared_lines:
+            cleared = len(cleared_lines)
+            points = line_clear_points(cleared, self.level)
+            self.score += points
+            before = [row[:] for row in grid]
+            if board is not None:
+                board.clear_lines(cleared_lines)
+            else:
+                collapse_lines(grid, cleared_lines)
+            self.lines_cleared += cleared
+            self.level = self.lines_cleared // 10 + 1
+            if self.level >= 256:
+                self.level = 1
+
+        self.current_piece = self.next_piece
+        self.next_piece = spawn_piece(self.rng)
+
+        if self.collision():
+            self.game_over = True
+
+        return LockResult(cleared_lines, points, before)
+
+    def step(self, action):
+        # Apply one action followed by one gravity step; returns the score gained
+        if self.game_over:
+            return 0
+        score_before = self.score
+        if action == LEFT:
+            self.move(-1)
+        elif action == RIGHT:
+            self.move(1)
+        elif action == DOWN:
+            self.soft_drop()
+        elif action == ROTATE:
+            self.rotate()
+        self.gravity()
+        return self.score - score_before
+
+
+# How long the board stays frozen after a line clear, the length of the
+# front end's wipe animation
+CLEAR_PAUSE_MS = 300
+
+# Length of one simulation step. Every NES_SPEEDS entry, the held-key repeat
+# delay and the clear pause are whole numbers of ticks, so gravity runs at
+# exactly its NES period whatever the render frame rate.
+TICK_MS = 10
+
+
+class TetrisController:
+    # The timing rules of main() on a fixed tick: held-key repeats, gravity
+    # at get_nes_speed and the pause after a line clear. frame() applies the
+    # inputs seen in a rendered frame and then runs that frame's ticks, so
+    # live play and replays run the same code. Inputs are (pressed, action)
+    # with action one of LEFT, RIGHT, DOWN, ROTATE.
+    def __init__(self, state, move_delay=100, clear_pause=CLEAR_PAUSE_MS):
+        self.state = state
+        self.move_delay = move_delay  # Delay between auto moves when holding (ms)
+        self.clear_pause = clear_pause
+        self.pause_left = 0
+        self.fall_time = 0
+        self.move_timer = 0
+        self.down_move_timer = 0
+        self.move_left = False
+        self.move_right = False
+        self.move_down = False
+
+    @property
+    def frozen(self):
+        return self.pause_left > 0
+
+    def handle_input(self, pressed, action):
+        state = self.state
+        if action == LEFT:
+            if pressed:
+                state.move(-1)
+                self.move_timer = 0  # Reset hold timer
+            self.move_left = pressed
+        elif action == RIGHT:
+            if pressed:
+                state.move(1)
+                self.move_timer = 0  # Reset hold timer
+            self.move_right = pressed
+        elif action == DOWN:
+            if pressed:
+                state.soft_drop()
+                self.down_move_timer = 0
+            self.move_down = pressed
+        elif action == ROTATE and pressed:
+            state.rotate()
+
+    def tick(self):
+        # Advance one TICK_MS step; returns the LockResult when a piece locked
+        state = self.state
+        if self.pause_left > 0:
+            # The board is frozen while cleared rows are being wiped
+            self.pause_left = max(self.pause_left - TICK_MS, 0)
+            if self.pause_left > 0:
+                return None
+
+        self.fall_time += TICK_MS
+        self.move_timer += TICK_MS
+        self.down_move_timer += TICK_MS
+
+        # Handle held key movement
+        if self.move_left and self.move_timer >= self.move_delay:
+            state.move(-1)
+            self.move_timer = 0
+
+        if self.move_right and self.move_timer >= self.move_delay:
+            state.move(1)
+            self.move_timer = 0
+
+        if self.move_down and self.down_move_timer >= self.move_delay:
+            state.soft_drop()
+            self.down_move_timer = 0
+
+        # Handle automatic falling
+        if self.fall_time >= get_nes_speed(state.level):
+            self.fall_time = 0
+            result = state.gravity()
+            if result and result.cleared_lines:
+                self.pause_left = self.clear_pause
+            return result
+        return None
+
+    def frame(self, ticks, inputs=()):
+        # Apply a frame's inputs, then run its ticks; returns the LockResults
+        # of the ticks that locked a piece
+        for pressed, action in inputs:
+            self.handle_input(pressed, action)
+        results = []
+        tick = self.tick
+        for _ in range(ticks):
+            if self.state.game_over:
+                break
+            result = tick()
+            if result is not None:
+                results.append(result)
+        return results
@@ -0,0 +1,33 @@
+from tetris_engine import TICK_MS
+
+# Turns render frame times into whole simulation ticks for
+# TetrisController.frame. Leftover time carries over to the next frame, so
+# the game runs at real speed whatever the frame rate. A slow frame is caught
+# up by running several ticks at once, but never more than MAX_CATCH_UP_MS
+# worth: past that the game slows down rather than spending every frame
+# catching up. In fast-forward mode each frame runs a fixed number of ticks
+# and real time is ignored.
+
+MAX_CATCH_UP_MS = 250
+
+
+class FixedTimestep:
+    def __init__(self, fast_forward=0, max_catch_up_ms=MAX_CATCH_UP_MS):
+        self.fast_forward = fast_forward  # ticks per frame, 0 for real time
+        self.max_ticks = max(max_catch_up_ms // TICK_MS, 1)
+        self.accumulator = 0
+        self.dropped_ms = 0  # real time skipped by the catch-up limit
+
+    def ticks(self, dt):
+        # Number of ticks to run for a frame that took dt ms
+        if self.fast_forward:
+            return self.fast_forward
+        self.accumulator += dt
+        ticks = self.accumulator // TICK_MS
+        if ticks > self.max_ticks:
+            self.dropped_ms += (ticks - self.max_ticks) * TICK_MS
+            ticks = self.max_ticks
+            self.accumulator %= TICK_MS
+        else:
+            self.accumulator -= ticks * TICK_MS
+        return ticks